@@ -1,11 +1,8 @@
-import aiohttp
 import asyncio
-import cv2
-import numpy as np
+import importlib
 import os
 from pathlib import Path
 import threading
-import time
 import traceback
 from functools import partial
 
@@ -15,23 +12,26 @@ from PyQt5.QtWidgets import (
     QComboBox,
     QCompleter,
     QDialog,
+    QFileDialog,
     QHBoxLayout,
     QLabel,
     QLineEdit,
     QMainWindow,
     QMenu,
     QPushButton,
+    QSlider,
     QStatusBar,
     QToolBar,
     QVBoxLayout,
 )
 from PyQt5.QtGui import QIcon, QPixmap
-from PyQt5.QtCore import pyqtSignal, pyqtSlot, Qt
+from PyQt5.QtCore import pyqtSignal, pyqtSlot, Qt, QTimer
 
-from gamepad import GamePad
-from client import Client
-from input_config_manager import InputConfigManagerPopup
-from robot_config_manager import RobotConfigManagerPopup
+# Modules importing cv2, numpy, pygame or aiohttp, and the popups, are imported when first needed,
+# so the main window is shown as early as possible
+from playback import RecordingPlayer, RecordingReader
+from recorder import SessionRecorder, get_recording_file_path, get_recordings_path, write_recording
+from replay import ReplayBuffer, ReplayClip
 
 
 class ImageLabel(QLabel):
@@ -194,10 +194,14 @@ Written by <a href=\"mailto:ivan@pirobot.net\">Ivan Marchand</a>
 
 class App(QMainWindow):
     gamepad_added_signal = pyqtSignal("PyQt_PyObject")
-    change_pixmap_signal = pyqtSignal(np.ndarray)
-    FPS_UPDATE_INTERVAL = 1
-
-    def __init__(self, host, full_screen):
+    change_pixmap_signal = pyqtSignal()
+    playback_pixmap_signal = pyqtSignal()
+    gamepad_imported_signal = pyqtSignal()
+    replay_signal = pyqtSignal(str)
+    input_config_changed_signal = pyqtSignal()
+
+    def __init__(self, host, full_screen, max_command_rate=20, video_window=4, decode_workers=2, grayscale=False,
+                 gamepad_rate=100, replay_seconds=10, replay_memory=32, watch_config=False):
         super().__init__()
 
         # Update window title
@@ -239,22 +243,62 @@ class App(QMainWindow):
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
 
+        # Telemetry, created with the first message, and its plots, created when opened from the View menu
+        self.telemetry = None
+        self.telemetry_panel = None
+        self.telemetry_lock = threading.Lock()
+
         # Connect to Host
         self.client = None
         self.host = host
-        self.fps = 0
-        self.frame_counter = 0
-        self.last_frame_ts = 0
+        self.max_command_rate = max_command_rate
+        self.gamepad_rate = gamepad_rate
+        self.gamepad = None
+        self.video_window = video_window
+        self.decode_workers = decode_workers
+        self.grayscale = grayscale
+        # Created with the first frame
+        self.frame_pipeline = None
+        self.recorder = SessionRecorder()
+        # Last seconds of the stream, for instant replay
+        self.replay_buffer = ReplayBuffer(seconds=replay_seconds, max_bytes=replay_memory * 1024 * 1024)
+        self.replay_signal.connect(self.run_replay_action)
+        self.recording_status = None
+        # Playback of a recording, decoded by its own pipeline to keep the live metrics apart
+        self.player = None
+        self.playback_pipeline = None
+        self.playback_timer = QTimer(self)
+        self.playback_timer.setInterval(33)
+        self.playback_timer.timeout.connect(self.update_playback)
+        self.create_playback_toolbar()
+        # connect its signal to the update_image slot
+        self.change_pixmap_signal.connect(self.update_image)
+        self.playback_pixmap_signal.connect(self.update_playback_image)
+        self.video_stream = None
         self.loop = None
         self.gamepad_thread = None
+        self.gamepad_imported_signal.connect(self.run_gamepad)
         if self.host is None:
             self.open_select_host_window()
         else:
-            self.connect_to_host(self.host)
+            # Connect once the window is shown
+            QTimer.singleShot(0, partial(self.connect_to_host, self.host))
         self.update_status_bar()
         self.gamepad_added_signal.connect(self.gamepad_added_callback)
         self.new_gamepad = set()
 
+        # Reload the input mappings when they are changed on disk, e.g. by another client
+        self.config_watcher = None
+        if watch_config:
+            from config_store import ConfigWatcher
+            self.input_config_changed_signal.connect(self.reload_input_config)
+            self.config_watcher = ConfigWatcher(
+                config_path=os.path.join(os.path.dirname(__file__), "config"),
+                user_config_path=self.user_config_path,
+                callback=self.input_config_changed_signal.emit
+            )
+            self.config_watcher.start()
+
     def create_toolbar(self):
         toolbar = QToolBar("Toolbar")
         self.addToolBar(toolbar)
@@ -273,16 +317,18 @@ class App(QMainWindow):
         # Record/Stop button
         record_action = QAction("Record Video", self)
         record_action.setIcon(QIcon(os.path.join(os.path.dirname(__file__), Path("pics/record.png"))))
-        record_action.triggered.connect(
-            lambda: self.client is None or self.client.start_video(source=self.source_selection.currentData())
-        )
+        record_action.triggered.connect(self.start_recording)
         toolbar.addAction(record_action)
         stop_action = QAction("Stop Video", self)
         stop_action.setIcon(QIcon(os.path.join(os.path.dirname(__file__), Path("pics/stop.png"))))
-        stop_action.triggered.connect(
-            lambda: self.client is None or self.client.stop_video()
-        )
+        stop_action.triggered.connect(self.stop_recording)
         toolbar.addAction(stop_action)
+        # Record on the robot or save the received stream on the client
+        self.record_mode_selection = QComboBox()
+        self.record_mode_selection.setFocusPolicy(Qt.NoFocus)
+        self.record_mode_selection.addItem("On Robot", "robot")
+        self.record_mode_selection.addItem("On Client", "client")
+        toolbar.addWidget(self.record_mode_selection)
         toolbar.addSeparator()
 
         # Capture Picture button
@@ -303,17 +349,89 @@ class App(QMainWindow):
         self.destination_selection.addItem("LCD", "lcd")
         toolbar.addWidget(self.destination_selection)
 
+    def create_playback_toolbar(self):
+        self.playback_toolbar = QToolBar("Playback")
+        self.addToolBarBreak()
+        self.addToolBar(self.playback_toolbar)
+
+        self.play_action = QAction("Play", self)
+        self.play_action.triggered.connect(self.toggle_playback)
+        self.playback_toolbar.addAction(self.play_action)
+        self.playback_slider = QSlider(Qt.Horizontal)
+        self.playback_slider.setFocusPolicy(Qt.NoFocus)
+        self.playback_slider.valueChanged.connect(self.seek_playback)
+        self.playback_toolbar.addWidget(self.playback_slider)
+        self.playback_speed_selection = QComboBox()
+        self.playback_speed_selection.setFocusPolicy(Qt.NoFocus)
+        for speed in RecordingPlayer.SPEEDS:
+            self.playback_speed_selection.addItem(f"x{speed}", speed)
+        self.playback_speed_selection.currentIndexChanged.connect(
+            lambda: self.player is None or self.player.set_speed(self.playback_speed_selection.currentData())
+        )
+        self.playback_toolbar.addWidget(self.playback_speed_selection)
+        close_playback_action = QAction("Back to Live", self)
+        close_playback_action.triggered.connect(self.close_recording)
+        self.playback_toolbar.addAction(close_playback_action)
+        self.playback_toolbar.hide()
+
+    def start_recording(self):
+        if self.record_mode_selection.currentData() == "client":
+            self.recorder.start()
+            self.recording_status = None
+        elif self.client is not None:
+            self.client.start_video(source=self.source_selection.currentData())
+
+    def stop_recording(self):
+        if self.record_mode_selection.currentData() == "client":
+            stats = self.recorder.stop()
+            if stats is not None and stats["error"] is not None:
+                self.recording_status = f"Recording failed: {stats['error']}"
+                self.update_status_bar()
+            elif stats is not None:
+                self.recording_status = f"Saved {os.path.basename(stats['file_path'])}: " \
+                                        f"{stats['frames_written']} frames, {stats['dropped']} dropped"
+                self.update_status_bar()
+        elif self.client is not None:
+            self.client.stop_video()
+
     def closeEvent(self,event):
         for popup in self.popups.values():
             if popup.isVisible():
                 popup.close()
-        GamePad.stop_gamepad()
+        if self.gamepad is not None:
+            self.gamepad.stop_gamepad()
+        if self.config_watcher is not None:
+            self.config_watcher.stop()
+        if "input_config_manager" in self.popups:
+            # Mappings saved just before closing are still being written
+            from config_store import ConfigStore
+            ConfigStore.get_instance().flush(timeout=5)
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self.recorder.stop()
+        self.close_recording()
+        for frame_pipeline in [self.frame_pipeline, self.playback_pipeline]:
+            if frame_pipeline is not None:
+                frame_pipeline.shutdown()
 
     def update_status_bar(self):
         # Update status bar
-        if self.client is not None and self.client.is_connected():
+        if self.player is not None:
+            status_message = f"Playback {self.player.reader.name} | {self.player.get_status()}"
+        elif self.client is not None and self.client.is_connected():
             status_message = f"Connected to {self.host} | {self.robot_name}"
-            status_message += f" | FPS: {self.fps}"
+            status_message += f" | FPS: {self.video_stream.fps}"
+            latency_status = self.frame_pipeline.metrics.get_status() if self.frame_pipeline is not None else ""
+            if latency_status:
+                status_message += f" | {latency_status}"
+            if self.recorder.is_recording():
+                stats = self.recorder.get_stats()
+                if stats["error"] is not None:
+                    status_message += f" | REC failed: {stats['error']}"
+                else:
+                    status_message += f" | REC {stats['frames_written']} frames, {stats['dropped']} dropped"
+            elif self.recording_status is not None:
+                status_message += f" | {self.recording_status}"
         else:
             status_message = "Connecting..."
 
@@ -324,6 +442,15 @@ class App(QMainWindow):
 
         # Creating Settings menu
         file_menu = QMenu("File", self)
+        # Export video metrics action
+        open_recording_action = QAction(self)
+        open_recording_action.setText("Open Recording")
+        open_recording_action.triggered.connect(self.open_recording_file)
+        file_menu.addAction(open_recording_action)
+        export_metrics_action = QAction(self)
+        export_metrics_action.setText("Export Video Metrics")
+        export_metrics_action.triggered.connect(self.export_video_metrics)
+        file_menu.addAction(export_metrics_action)
         # Select host action
         quit_action = QAction(self)
         quit_action.setText("Quit")
@@ -355,6 +482,14 @@ class App(QMainWindow):
 
         menu_bar.addMenu(setting_menu)
 
+        # Creating View menu
+        view_menu = QMenu("View", self)
+        telemetry_action = QAction(self)
+        telemetry_action.setText("Telemetry")
+        telemetry_action.triggered.connect(self.open_telemetry_panel)
+        view_menu.addAction(telemetry_action)
+        menu_bar.addMenu(view_menu)
+
         # Creating Help menu
         help_menu = QMenu("Help", self)
         # Select host action
@@ -366,21 +501,31 @@ class App(QMainWindow):
         menu_bar.addMenu(help_menu)
 
     def _connect_to_host(self, host):
+        from connection import run_loop
         if self.loop is not None:
-            self.loop.stop()
+            # The connections of the previous host are closed by its own thread
+            self.loop.call_soon_threadsafe(self.loop.stop)
         self.loop = asyncio.new_event_loop()
         self.loop.create_task(self.client.connect(host))
         self.loop.create_task(self.connect_to_stream_socket(host))
-        self.loop.run_forever()
+        run_loop(self.loop)
 
     def connect_to_host(self, host):
         try:
-            self.client = Client(app=self, robot_config=self.robot_config)
+            from client import Client
+            from video_stream import VideoStream
+            if self.video_stream is None:
+                self.video_stream = VideoStream(
+                    frame_callback=self.on_video_frame,
+                    window=self.video_window,
+                    decode_time=self.get_frame_time
+                )
+            self.client = Client(app=self, robot_config=self.robot_config, max_command_rate=self.max_command_rate)
             self.client.register_consumer("status", self.robot_init_callback)
+            self.client.register_consumer("status", self.on_telemetry)
+            self.client.register_consumer("telemetry", self.on_telemetry)
             threading.Thread(target=self._connect_to_host, kwargs=dict(host=host), daemon=True).start()
 
-            # connect its signal to the update_image slot
-            self.change_pixmap_signal.connect(self.update_image)
             # GamePad
             self.start_gamepad()
             # Status bar
@@ -397,44 +542,75 @@ class App(QMainWindow):
 
     async def connect_to_stream_socket(self, host):
         self.host = host
-        while True:
-            try:
-                url = f"http://{host}/ws/video_stream"
-                session = aiohttp.ClientSession()
-                async with session.ws_connect(url, receive_timeout=10.0) as ws:
-                    print(f"Connected to {url}")
-                    await ws.send_str("start")
-                    async for msg in ws:
-                        frame = np.frombuffer(msg.data, dtype="byte")
-                        frame = cv2.imdecode(frame, cv2.IMREAD_UNCHANGED)
-                        # Ready for next frame
-                        await ws.send_str("ready")
-                        # Update fps
-                        self.frame_counter += 1
-                        now = time.time()
-                        if now > self.last_frame_ts + self.FPS_UPDATE_INTERVAL:
-                            self.fps = round(self.frame_counter / (now - self.last_frame_ts))
-                            self.last_frame_ts = now
-                            self.frame_counter = 0
-
-                        self.change_pixmap_signal.emit(frame)
-            except:
-                traceback.print_exc()
-            print(f"Unable to connect to {url}, reconnecting")
-            await asyncio.sleep(1)
+        await self.video_stream.connect(host)
+
+    def create_frame_pipeline(self, workers, frame_ready_callback):
+        # cv2 and numpy are imported here, with the first frame to decode
+        from frame_decoder import FrameDecoder
+        from frame_pipeline import FramePipeline
+        return FramePipeline(
+            frame_ready_callback=frame_ready_callback,
+            workers=workers,
+            decoder=FrameDecoder(grayscale=self.grayscale)
+        )
+
+    def get_frame_time(self):
+        return self.frame_pipeline.get_frame_time() if self.frame_pipeline is not None else 0.0
+
+    def on_video_frame(self, data):
+        if self.player is None:
+            if self.frame_pipeline is None:
+                self.frame_pipeline = self.create_frame_pipeline(self.decode_workers, self.change_pixmap_signal.emit)
+            self.frame_pipeline.submit(data)
+        if self.recorder.is_recording():
+            self.recorder.put(data)
+        self.replay_buffer.append(data)
 
     def start_gamepad(self):
+        if self.gamepad is not None:
+            self.run_gamepad()
+        elif self.gamepad_thread is None:
+            # pygame is imported once by a thread, not to block the GUI thread, which then starts the loop
+            self.gamepad_thread = threading.Thread(target=self.import_gamepad, daemon=True)
+            self.gamepad_thread.start()
+
+    def import_gamepad(self):
+        importlib.import_module("gamepad")
+        self.gamepad_imported_signal.emit()
+
+    def run_gamepad(self):
+        """Called by the GUI thread only, like the input config popup, so the loop is never started twice at once"""
+        from gamepad import GamePad
+        self.gamepad = GamePad
         callback = {
-            "axis_motion": self.client.gamepad_absolute_axis_callback,
+            "axis_snapshot": self.client.gamepad_axis_snapshot_callback,
             "button": self.client.gamepad_button_callback,
             "hat_motion": self.client.gamepad_hat_callback,
             "joystick_added": self.gamepad_added_signal.emit,
         }
-        GamePad.start_gamepad(callback=callback)
+        GamePad.start_gamepad(callback=callback, active_rate=self.gamepad_rate)
+
+    def get_telemetry(self):
+        with self.telemetry_lock:
+            if self.telemetry is None:
+                from telemetry import TelemetryBuffer
+                self.telemetry = TelemetryBuffer()
+        return self.telemetry
+
+    def on_telemetry(self, message):
+        self.get_telemetry().append_message(message)
+
+    def open_telemetry_panel(self):
+        if self.telemetry_panel is None:
+            from telemetry import TelemetryPanel
+            self.telemetry_panel = TelemetryPanel(self.get_telemetry(), self)
+            self.addDockWidget(Qt.BottomDockWidgetArea, self.telemetry_panel)
+        self.telemetry_panel.show()
 
     def robot_init_callback(self, message):
         self.robot_name = message["robot_name"]
         self.robot_config = message["config"]
+        self.client.input_config_manager.set_robot_config(self.robot_config)
         self.update_status_bar()
 
     def open_about_window(self):
@@ -459,11 +635,13 @@ class App(QMainWindow):
 
     def open_robot_config_manager(self):
         if "robot_config_manager" not in self.popups or not self.popups["robot_config_manager"].isVisible():
+            from robot_config_manager import RobotConfigManagerPopup
             self.popups["robot_config_manager"] = RobotConfigManagerPopup(client=self.client)
             self.popups["robot_config_manager"].show()
 
     def open_input_config_manager(self, joystick=None):
         if "input_config_manager" not in self.popups or not self.popups["input_config_manager"].isVisible():
+            from input_config_manager import InputConfigManagerPopup
             self.popups["input_config_manager"] = InputConfigManagerPopup(
                 robot_config=self.robot_config,
                 close_callback=self.reload_input_device_config,
@@ -471,26 +649,127 @@ class App(QMainWindow):
             )
             self.popups["input_config_manager"].show()
 
-    def reload_input_device_config(self):
-        self.start_gamepad()
-        self.client.input_config_manager.load()
+    def export_video_metrics(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Video Metrics", "video_metrics.json", "JSON (*.json)")
+        if file_path and self.frame_pipeline is not None:
+            self.frame_pipeline.metrics.export(file_path)
+
+    def open_recording_file(self):
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Open Recording", get_recordings_path(), "Recordings (*.pirec)"
+        )
+        if file_path:
+            self.open_recording(file_path)
 
-    @pyqtSlot(np.ndarray)
-    def update_image(self, cv_img):
-        """Updates the image_label with ap new opencv image"""
-        qt_img = self.convert_cv_qt(cv_img)
-        self.image_label.setPixmap(qt_img)
+    def open_recording(self, file_path):
+        try:
+            reader = RecordingReader(file_path)
+        except:
+            traceback.print_exc()
+            return
+        self.open_player(reader)
+
+    def run_replay_action(self, action):
+        if action == "play":
+            frames = self.replay_buffer.get_frames()
+            if frames:
+                self.open_player(ReplayClip(frames))
+                self.toggle_playback()
+        elif action == "save":
+            frames = self.replay_buffer.get_frames()
+            if frames:
+                file_path = get_recording_file_path(prefix="replay")
+                threading.Thread(target=write_recording, args=(file_path, frames), daemon=True).start()
+                self.recording_status = f"Saved {os.path.basename(file_path)}: {len(frames)} frames"
+                self.update_status_bar()
+
+    def open_player(self, reader):
+        self.close_recording()
+        if self.playback_pipeline is None:
+            self.playback_pipeline = self.create_frame_pipeline(1, self.playback_pixmap_signal.emit)
+        self.player = RecordingPlayer(reader, frame_callback=self.playback_pipeline.submit)
+        self.player.set_speed(self.playback_speed_selection.currentData())
+        self.playback_slider.blockSignals(True)
+        self.playback_slider.setRange(0, max(len(reader) - 1, 0))
+        self.playback_slider.setValue(0)
+        self.playback_slider.blockSignals(False)
+        self.playback_toolbar.show()
+        self.player.tick()
+        self.update_status_bar()
+
+    def close_recording(self):
+        if self.player is None:
+            return
+        self.playback_timer.stop()
+        self.play_action.setText("Play")
+        self.playback_toolbar.hide()
+        self.player.reader.close()
+        self.player = None
         self.update_status_bar()
 
-    def convert_cv_qt(self, cv_img):
-        """Convert from an opencv image to QPixmap"""
-        rgb_image = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
-        rgb_image = cv2.resize(rgb_image, (self.image_label.size().width(), self.image_label.size().height()))
-        h, w, ch = rgb_image.shape
-        bytes_per_line = ch * w
-        convert_to_Qt_format = QtGui.QImage(rgb_image.data, w, h, bytes_per_line, QtGui.QImage.Format_RGB888)
-        p = convert_to_Qt_format.scaled(w, h, Qt.KeepAspectRatio)
-        return QPixmap.fromImage(p)
+    def toggle_playback(self):
+        if self.player is None:
+            return
+        if self.player.is_playing():
+            self.player.pause()
+            self.playback_timer.stop()
+            self.play_action.setText("Play")
+        else:
+            self.player.play()
+            self.playback_timer.start()
+            self.play_action.setText("Pause")
+
+    def seek_playback(self, frame):
+        if self.player is not None:
+            self.player.seek_frame(frame)
+            self.update_status_bar()
+
+    def update_playback(self):
+        frame = self.player.tick()
+        if frame is not None:
+            self.playback_slider.blockSignals(True)
+            self.playback_slider.setValue(frame)
+            self.playback_slider.blockSignals(False)
+        if not self.player.is_playing():
+            self.playback_timer.stop()
+            self.play_action.setText("Play")
+        self.update_status_bar()
+
+    def reload_input_device_config(self):
+        self.start_gamepad()
+        self.reload_input_config()
+
+    def reload_input_config(self):
+        # Only the files changed since the last load are read again
+        if self.client is not None and self.client.input_config_manager.load():
+            print("Input configuration reloaded")
+
+    @pyqtSlot()
+    def update_image(self):
+        """Updates the image_label with the latest image converted by the live frame pipeline"""
+        self.paint_latest_image(self.frame_pipeline, visible=self.player is None)
+
+    @pyqtSlot()
+    def update_playback_image(self):
+        self.paint_latest_image(self.playback_pipeline, visible=self.player is not None)
+
+    def paint_latest_image(self, frame_pipeline, visible):
+        if frame_pipeline is None:
+            return
+        # Always taken, the pipeline only notifies the next frame once the latest one was taken
+        qt_img = frame_pipeline.get_latest_image()
+        if qt_img is None:
+            return
+        if not visible:
+            # Decoded before switching between live and playback
+            frame_pipeline.release_image(qt_img)
+            return
+        pixmap = QPixmap.fromImage(qt_img)
+        frame_pipeline.release_image(qt_img)
+        self.image_label.setPixmap(pixmap)
+        frame_pipeline.frame_painted()
+        frame_pipeline.set_target_size(self.image_label.size().width(), self.image_label.size().height())
+        self.update_status_bar()
 
     def gamepad_added_callback(self, joystick):
         if not self.client.input_config_manager.is_configured(joystick) and joystick.get_guid() not in self.new_gamepad:
@@ -0,0 +1,66 @@
+import math
+
+
+class AxisCalibration(object):
+    """Maps the raw range of a worn or off-center axis back to [-1, 1]"""
+
+    def __init__(self, center=0.0, minimum=-1.0, maximum=1.0):
+        self.center = center
+        self.negative_range = max(center - minimum, 1e-6)
+        self.positive_range = max(maximum - center, 1e-6)
+
+    def apply(self, value):
+        if value >= self.center:
+            value = (value - self.center) / self.positive_range
+        else:
+            value = (value - self.center) / self.negative_range
+        return min(max(value, -1.0), 1.0)
+
+
+class StickFilter(object):
+    """Radial deadzone, response curve, quantization and hysteresis for a 2 axes group"""
+
+    DEFAULT_CONFIG = dict(deadzone=0.08, expo=0.3, steps=20, hysteresis=0.02)
+    LUT_SIZE = 1024
+
+    def __init__(self, deadzone=0.08, expo=0.3, steps=20, hysteresis=0.02):
+        self.deadzone = deadzone
+        self.steps = steps
+        self.hysteresis = hysteresis
+        # Response curve of the stick deflection, precomputed
+        self.curve = [
+            (1.0 - expo) * t + expo * t ** 3 for t in (i / (self.LUT_SIZE - 1) for i in range(self.LUT_SIZE))
+        ]
+        self.last_output = {"x": 0.0, "y": 0.0}
+
+    @classmethod
+    def from_config(cls, config):
+        filter_config = dict(cls.DEFAULT_CONFIG)
+        filter_config.update({key: value for key, value in config.items() if key in cls.DEFAULT_CONFIG})
+        return cls(**filter_config)
+
+    def quantize(self, axis_name, value):
+        if not self.steps:
+            return value
+        last = self.last_output[axis_name]
+        quantized = round(value * self.steps) / self.steps
+        # Stay on the previous step until the input clearly moved past the boundary
+        if quantized != last and quantized != 0.0 and abs(value - last) < 0.5 / self.steps + self.hysteresis:
+            return last
+        return quantized
+
+    def apply(self, x_pos, y_pos):
+        radius = math.hypot(x_pos, y_pos)
+        if radius <= self.deadzone:
+            x_pos, y_pos = 0.0, 0.0
+        else:
+            scaled_radius = min((radius - self.deadzone) / (1.0 - self.deadzone), 1.0)
+            curved_radius = self.curve[int(scaled_radius * (self.LUT_SIZE - 1))]
+            x_pos *= curved_radius / radius
+            y_pos *= curved_radius / radius
+
+        x_pos = self.quantize("x", x_pos)
+        y_pos = self.quantize("y", y_pos)
+        self.last_output["x"] = x_pos
+        self.last_output["y"] = y_pos
+        return x_pos, y_pos
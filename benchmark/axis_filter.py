@@ -0,0 +1,68 @@
+import argparse
+import json
+import math
+import random
+
+from axis_filter import StickFilter
+
+
+def stick_signal(samples, rate, noise):
+    """Stick held, swept and released, with sensor noise and a worn center"""
+    for i in range(samples):
+        t = i / rate
+        phase = t % 8
+        if phase < 2:
+            x, y = 0.0, 0.0
+        elif phase < 4:
+            x, y = 0.0, -0.6
+        elif phase < 6:
+            x, y = 0.5 * math.sin(t), -0.6
+        else:
+            x, y = 0.0, 0.0
+        yield (x, y), (x + random.gauss(0.02, noise), y + random.gauss(-0.01, noise))
+
+
+def count_messages(outputs):
+    """Messages actually sent: identical consecutive setpoints are suppressed by the sender"""
+    messages = 0
+    last = None
+    for x_pos, y_pos in outputs:
+        setpoint = (int(round(x_pos * 100)), int(round(y_pos * 100)))
+        if setpoint != last:
+            messages += 1
+            last = setpoint
+    return messages
+
+
+def run(name, stick_filter, samples, rate, noise):
+    random.seed(0)
+    outputs = []
+    errors = []
+    for (x, y), (noisy_x, noisy_y) in stick_signal(samples, rate, noise):
+        output = stick_filter.apply(noisy_x, noisy_y) if stick_filter is not None else (noisy_x, noisy_y)
+        outputs.append(output)
+        errors.append(max(abs(output[0] - x), abs(output[1] - y)))
+    duration = samples / rate
+    return {
+        "filter": name,
+        "messages_per_sec": count_messages(outputs) / duration,
+        "mean_error": sum(errors) / len(errors),
+        "max_error": max(errors),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Messages per second sent for a noisy stick, with and without filter")
+    parser.add_argument("--rate", type=int, default=100, help="Axis events per second")
+    parser.add_argument("--duration", type=float, default=32.0)
+    parser.add_argument("--noise", type=float, default=0.01)
+    args = parser.parse_args()
+
+    samples = int(args.rate * args.duration)
+    results = [
+        run("none", None, samples, args.rate, args.noise),
+        run("deadzone", StickFilter(expo=0.0, steps=0, hysteresis=0.0), samples, args.rate, args.noise),
+        run("default", StickFilter(**StickFilter.DEFAULT_CONFIG), samples, args.rate, args.noise),
+        run("linear", StickFilter(expo=0.0), samples, args.rate, args.noise),
+    ]
+    print(json.dumps(results, indent=2))
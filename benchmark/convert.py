@@ -0,0 +1,76 @@
+import argparse
+import cv2
+import json
+import numpy as np
+import time
+import tracemalloc
+
+from PyQt5 import QtGui
+from PyQt5.QtCore import Qt
+
+from benchmark.robot_server import RobotServer
+from frame_pipeline import FrameConverter
+
+
+def legacy_convert_cv_qt(cv_img, width, height):
+    """Previous implementation: color conversion, resize, QImage and scaled copies"""
+    rgb_image = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
+    rgb_image = cv2.resize(rgb_image, (width, height))
+    h, w, ch = rgb_image.shape
+    bytes_per_line = ch * w
+    convert_to_Qt_format = QtGui.QImage(rgb_image.data, w, h, bytes_per_line, QtGui.QImage.Format_RGB888)
+    return convert_to_Qt_format.scaled(w, h, Qt.KeepAspectRatio)
+
+
+def run(name, convert, frames, width, height):
+    # Warm up, fills the buffer pool
+    convert(frames[0], width, height)
+
+    start = time.perf_counter()
+    for frame in frames:
+        convert(frame, width, height)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    peaks = []
+    for frame in frames:
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        convert(frame, width, height)
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    return {
+        "converter": name,
+        "convert_ms": 1000 * elapsed / len(frames),
+        "allocated_kb_per_frame": sum(peaks) / len(peaks) / 1024,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the per frame cost of the QImage conversion")
+    parser.add_argument("-n", "--count", type=int, default=200)
+    parser.add_argument("--width", type=int, default=1280, help="Stream width")
+    parser.add_argument("--height", type=int, default=720, help="Stream height")
+    parser.add_argument("--display_width", type=int, default=800)
+    parser.add_argument("--display_height", type=int, default=600)
+    args = parser.parse_args()
+
+    encoded_frames = RobotServer.generate_frames(args.width, args.height, quality=80)
+    frames = [
+        cv2.imdecode(np.frombuffer(encoded_frames[i % len(encoded_frames)], dtype=np.uint8), cv2.IMREAD_COLOR)
+        for i in range(args.count)
+    ]
+
+    converter = FrameConverter()
+
+    def pooled_convert(frame, width, height):
+        image = converter.convert_cv_qt(frame, width, height)
+        converter.release(image)
+        return image
+
+    results = [
+        run("legacy", legacy_convert_cv_qt, frames, args.display_width, args.display_height),
+        run("pooled", pooled_convert, frames, args.display_width, args.display_height),
+    ]
+    results[-1]["buffers_allocated"] = converter.pool.allocated
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import json
+import time
+
+from dispatcher import MessageDispatcher
+
+
+def build_messages(count, config_every):
+    """Status messages at a high rate, with a configuration message from time to time"""
+    config = {f"key_{i}": dict(type="str", value=str(i), default="", category="general") for i in range(100)}
+    messages = []
+    for i in range(count):
+        if i % config_every == 0:
+            messages.append(json.dumps(dict(topic="configuration", message=dict(config=config, success=True,
+                                                                                   action="get"))))
+        else:
+            messages.append(json.dumps(dict(topic="status", message=dict(robot_name="robot", seq=i, config={}))))
+    return messages
+
+
+def slow_consumer(consumer_time):
+    def consumer(message):
+        time.sleep(consumer_time)
+    return consumer
+
+
+async def receive(messages, dispatch, interval):
+    """Stand-in for the websocket loop, returns the longest time the loop was busy with a message"""
+    stall = 0.0
+    for data in messages:
+        start = time.perf_counter()
+        await dispatch(data)
+        stall = max(stall, time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    return stall
+
+
+def run_inline(messages, consumer_time, interval):
+    """Previous implementation: json.loads and the consumers called on the receive loop"""
+    consumers = {"status": [lambda message: None], "configuration": [slow_consumer(consumer_time)]}
+
+    async def dispatch(data):
+        message = json.loads(data)
+        for consumer in consumers.get(message["topic"], []):
+            consumer(message["message"])
+
+    start = time.perf_counter()
+    stall = asyncio.run(receive(messages, dispatch, interval))
+    return {"mode": "inline", "elapsed_s": time.perf_counter() - start, "max_loop_stall_ms": 1000 * stall}
+
+
+def run_dispatcher(messages, consumer_time, interval):
+    dispatcher = MessageDispatcher()
+    dispatcher.register_consumer("status", lambda message: None)
+    dispatcher.register_consumer("configuration", slow_consumer(consumer_time))
+    start = time.perf_counter()
+    stall = asyncio.run(receive(messages, dispatcher.dispatch, interval))
+    result = {"mode": "dispatcher", "elapsed_s": time.perf_counter() - start, "max_loop_stall_ms": 1000 * stall}
+    result.update(dispatcher.get_stats())
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Receive loop stalls caused by a slow consumer")
+    parser.add_argument("-n", "--count", type=int, default=2000)
+    parser.add_argument("--config_every", type=int, default=200, help="One configuration message every N messages")
+    parser.add_argument("--consumer_time", type=float, default=0.2, help="Time taken by the configuration consumer")
+    parser.add_argument("--interval", type=float, default=0.001, help="Time between two messages")
+    args = parser.parse_args()
+
+    messages = build_messages(args.count, args.config_every)
+    results = [
+        run_inline(messages, args.consumer_time, args.interval),
+        run_dispatcher(messages, args.consumer_time, args.interval),
+    ]
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,53 @@
+import argparse
+import json
+import time
+
+from benchmark.send_rate import drive_message
+from message_codec import MessageCodec
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def camera_message(i):
+    return dict(type="camera", action="set_position", args=dict(position=i % 101))
+
+
+def run(name, encode, messages):
+    encoded = [encode(message) for message in messages]
+    start = time.perf_counter()
+    for message in messages:
+        encode(message)
+    elapsed = time.perf_counter() - start
+    return {
+        "encoding": name,
+        "bytes_per_message": sum(len(data) for data in encoded) / len(encoded),
+        "encode_us": 1e6 * elapsed / len(messages),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the size and encode time of the control messages")
+    parser.add_argument("-n", "--count", type=int, default=100000)
+    args = parser.parse_args()
+
+    codec = MessageCodec()
+    encoders = {
+        "json": lambda message: json.dumps(dict(topic="robot", message=message)).encode(),
+        "struct": codec.encode,
+    }
+    if msgpack is not None:
+        encoders["msgpack"] = lambda message: msgpack.packb(dict(topic="robot", message=message))
+
+    results = []
+    for message_name, generator in [("drive/move", drive_message), ("camera/set_position", camera_message)]:
+        messages = [generator(i) for i in range(args.count)]
+        # The binary frames must decode to the original messages
+        assert all(codec.decode(codec.encode(message)) == message for message in messages[:1000])
+        for name, encode in encoders.items():
+            result = run(name, encode, messages)
+            result["message"] = message_name
+            results.append(result)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import json
+import threading
+import time
+
+from benchmark.robot_server import RobotServer
+from fleet import FleetRobot
+
+
+def run(servers, background_fps, duration, display_width, display_height):
+    """CPU used by the client for a fleet, the first robot is focused"""
+    robots = []
+
+    def frame_ready(index):
+        # Paint every image, as a GUI thread keeping up would
+        pipeline = robots[index].frame_pipeline
+        image = pipeline.get_latest_image()
+        if image is not None:
+            pipeline.release_image(image)
+            pipeline.frame_painted()
+
+    for index, server in enumerate(servers):
+        robot = FleetRobot(None, index, server.address, frame_ready_callback=frame_ready)
+        robot.budget.max_fps = None if index == 0 else background_fps
+        robot.frame_pipeline.set_target_size(display_width // (1 if index == 0 else 2),
+                                             display_height // (1 if index == 0 else 2))
+        robots.append(robot)
+
+    loop = asyncio.new_event_loop()
+    for robot in robots:
+        robot.start(loop)
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    # Connection and negotiation are not measured
+    time.sleep(2.0)
+    painted = [robot.frame_pipeline.metrics.painted for robot in robots]
+    cpu_start = time.process_time()
+    start = time.monotonic()
+    time.sleep(duration)
+    elapsed = time.monotonic() - start
+    cpu = time.process_time() - cpu_start
+    painted = [(robot.frame_pipeline.metrics.painted - before) / elapsed for robot, before in zip(robots, painted)]
+    loop.call_soon_threadsafe(loop.stop)
+    for robot in robots:
+        robot.frame_pipeline.shutdown()
+    return {
+        "robots": len(robots),
+        "background_fps": background_fps,
+        "cpu_percent": 100 * cpu / elapsed,
+        "focused_fps": painted[0],
+        "background_painted_fps": painted[1:],
+        "decimated": sum(robot.decimated for robot in robots),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Client CPU usage against the number of robots in fleet mode")
+    parser.add_argument("-p", "--port", type=int, default=8780)
+    parser.add_argument("--max_robots", type=int, default=4)
+    parser.add_argument("--background_fps", type=int, default=5)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--display_width", type=int, default=640)
+    parser.add_argument("--display_height", type=int, default=360)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    servers = [
+        RobotServer(port=args.port + i, robot_name=f"StandInRobot{i}", width=args.width, height=args.height,
+                    fps=args.fps)
+        for i in range(args.max_robots)
+    ]
+    for server in servers:
+        server.start()
+    results = []
+    for count in range(1, args.max_robots + 1):
+        for background_fps in [None, args.background_fps]:
+            results.append(run(servers[:count], background_fps, args.duration, args.display_width,
+                               args.display_height))
+    for server in servers:
+        server.stop()
+    print(json.dumps(results, indent=2))
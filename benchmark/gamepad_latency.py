@@ -0,0 +1,131 @@
+import argparse
+import collections
+import json
+import os
+import random
+import threading
+import time
+
+# No window is needed to receive joystick events
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from gamepad import GamePad
+
+FAKE_INSTANCE_ID = -1
+
+
+class FakeJoystick(object):
+
+    def get_guid(self):
+        return "fake"
+
+    def get_name(self):
+        return "Fake gamepad"
+
+    def get_axis(self, axis):
+        return 0.0
+
+
+def legacy_loop(callback, state):
+    """Previous implementation: poll the event queue at 30 Hz"""
+    joysticks = {FAKE_INSTANCE_ID: FakeJoystick()}
+    clock = pygame.time.Clock()
+    while state["running"]:
+        for event in pygame.event.get():
+            if event.type == pygame.JOYAXISMOTION:
+                callback["axis_motion"](joysticks[event.instance_id], event.axis)
+        clock.tick(30)
+
+
+def run(mode, count, interval):
+    posted = collections.deque()
+    latencies = []
+    received = threading.Event()
+
+    def axis_motion(joystick, axis):
+        latencies.append(time.perf_counter() - posted.popleft())
+        if len(latencies) == count:
+            received.set()
+
+    callback = {"axis_motion": axis_motion}
+    state = dict(running=True)
+    pygame.init()
+    if mode == "legacy":
+        thread = threading.Thread(target=legacy_loop, args=(callback, state), daemon=True)
+        thread.start()
+    else:
+        GamePad.start_gamepad(callback=callback)
+        while not GamePad.running:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        GamePad.joysticks[FAKE_INSTANCE_ID] = FakeJoystick()
+
+    # Idle CPU, without any event
+    cpu_start = time.process_time()
+    time.sleep(2.0)
+    idle_cpu = (time.process_time() - cpu_start) / 2.0
+
+    for i in range(count):
+        posted.append(time.perf_counter())
+        pygame.event.post(pygame.event.Event(pygame.JOYAXISMOTION, instance_id=FAKE_INSTANCE_ID, axis=0,
+                                             value=random.random()))
+        time.sleep(interval * random.random())
+    received.wait(timeout=10)
+
+    stop_start = time.perf_counter()
+    if mode == "legacy":
+        state["running"] = False
+        thread.join()
+    else:
+        GamePad.stop_gamepad()
+    stop_time = time.perf_counter() - stop_start
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "idle_cpu_percent": 100 * idle_cpu,
+        "events": count,
+        "callbacks": len(latencies),
+        "latency_p50_ms": 1000 * latencies[len(latencies) // 2],
+        "latency_max_ms": 1000 * latencies[-1],
+        "stop_ms": 1000 * stop_time,
+    }
+
+
+def run_batching(count):
+    """Stick movements emitting several x/y events each, delivered as axis snapshots"""
+    snapshots = []
+    GamePad.stats.clear()
+    GamePad.start_gamepad(callback={"axis_snapshot": lambda joystick, values, changed: snapshots.append(changed)})
+    while not GamePad.running:
+        time.sleep(0.01)
+    time.sleep(0.1)
+    GamePad.joysticks[FAKE_INSTANCE_ID] = FakeJoystick()
+    for i in range(count):
+        for axis in [0, 1, 0, 1]:
+            pygame.event.post(pygame.event.Event(pygame.JOYAXISMOTION, instance_id=FAKE_INSTANCE_ID, axis=axis,
+                                                 value=random.random()))
+        time.sleep(0.01)
+    time.sleep(0.1)
+    GamePad.stop_gamepad()
+    stats = GamePad.get_stats()
+    return {
+        "mode": "batching",
+        "axis_events": stats.get("axis_events", 0),
+        "callbacks": stats.get("callbacks", 0),
+        "events_per_callback": stats.get("axis_events", 0) / max(stats.get("callbacks", 0), 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the gamepad event to callback latency")
+    parser.add_argument("-n", "--count", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.02, help="Maximum time between two events")
+    args = parser.parse_args()
+
+    results = [run(mode, args.count, args.interval) for mode in ["legacy", "event"]]
+    results[-1]["gamepad_stats"] = GamePad.get_stats()
+    results.append(run_batching(args.count))
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,114 @@
+import argparse
+import json
+import time
+
+from input_config_manager import InputConfigManager
+
+
+class FakeJoystick(object):
+
+    def __init__(self, guid):
+        self.guid = guid
+
+    def get_guid(self):
+        return self.guid
+
+    def get_name(self):
+        return f"Gamepad {self.guid}"
+
+    def get_axis(self, axis):
+        return 0.5
+
+
+def legacy_get_action_for_keyboard_event(manager, event):
+    for action, action_event in manager.keyboard_mapping.items():
+        if action_event == event:
+            return action
+    return None
+
+
+def legacy_get_action_for_gamepad_button(manager, joystick, button):
+    event = {"type": "button", "button": button}
+    guid = joystick.get_guid()
+    if guid in manager.gamepad_mapping:
+        for action, action_event in manager.gamepad_mapping[guid]["actions"].items():
+            if action_event == event:
+                return action
+    return None
+
+
+def legacy_axis_dispatch(manager, joystick, axis):
+    guid = joystick.get_guid()
+    axis_group = None
+    for group, axis_group_event in manager.gamepad_mapping[guid]["axis_group"].items():
+        if axis_group_event["axis"] == axis:
+            axis_group = group
+    group = None
+    for action_config in manager.actions.values():
+        if action_config.get("axis_group") == axis_group:
+            group = action_config.get("group")
+            break
+    position = {}
+    for action_config in manager.actions.values():
+        if group is not None and action_config.get("group") == group:
+            axis_name = action_config.get("axis_name")
+            axis_group = action_config.get("axis_group")
+            if axis_name is not None and axis_group is not None and axis_name not in position:
+                axis = manager.gamepad_mapping[guid]["axis_group"].get(axis_group, {}).get("axis")
+                if axis is not None:
+                    position[axis_name] = joystick.get_axis(axis)
+    return position
+
+
+def indexed_axis_dispatch(manager, joystick, axis):
+    group = manager.get_group_for_axis(joystick, axis)
+    return manager.get_axis_position_for_group(joystick, group)
+
+
+def build_manager(action_count, joystick):
+    manager = InputConfigManager(robot_config={})
+    for i in range(action_count):
+        manager.actions[f"action_{i}"] = {"group": f"group_{i % 10}", "commands": []}
+    # Axis actions at the end, the worst case for the linear scans
+    manager.actions["drive_x"] = {"group": "drive", "axis_group": "turn", "axis_name": "x"}
+    manager.actions["drive_y"] = {"group": "drive", "axis_group": "drive", "axis_name": "y"}
+    manager.keyboard_mapping = {f"action_{i}": {"type": "key", "key": i} for i in range(action_count)}
+    manager.build_indexes()
+    for i in range(action_count):
+        manager.set_gamepad_button_for_action(f"action_{i}", joystick, i)
+    manager.set_gamepad_axis_for_action("drive_x", joystick, 0)
+    manager.set_gamepad_axis_for_action("drive_y", joystick, 1)
+    return manager
+
+
+def run(name, dispatch, count):
+    start = time.perf_counter()
+    for i in range(count):
+        dispatch(i)
+    return {"dispatch": name, "us_per_event": 1e6 * (time.perf_counter() - start) / count}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the input event dispatch cost")
+    parser.add_argument("-n", "--count", type=int, default=10000)
+    parser.add_argument("-a", "--actions", type=int, default=1000)
+    args = parser.parse_args()
+
+    joystick = FakeJoystick("0300000000000000")
+    manager = build_manager(args.actions, joystick)
+    last_key = args.actions - 1
+    results = [
+        run("keyboard_legacy",
+            lambda i: legacy_get_action_for_keyboard_event(manager, {"type": "key", "key": last_key}), args.count),
+        run("keyboard_indexed",
+            lambda i: manager.get_axis_group_for_keyboard_key(last_key), args.count),
+        run("button_legacy",
+            lambda i: legacy_get_action_for_gamepad_button(manager, joystick, last_key), args.count),
+        run("button_indexed",
+            lambda i: manager.get_action_for_gamepad_button(joystick, last_key), args.count),
+        run("axis_legacy", lambda i: legacy_axis_dispatch(manager, joystick, i % 2), args.count),
+        run("axis_indexed", lambda i: indexed_axis_dispatch(manager, joystick, i % 2), args.count),
+    ]
+    for result in results:
+        result["actions"] = args.actions
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,84 @@
+import argparse
+import json
+import time
+
+from benchmark.robot_server import RobotServer
+from frame_decoder import FrameDecoder
+from frame_pipeline import FramePipeline
+
+
+def wait_for_processing(pipeline):
+    while pipeline.timers["convert"].count + pipeline.dropped_stale + pipeline.errors < pipeline.submitted:
+        time.sleep(0.0005)
+
+
+def run_decode(frames, count, width, height, **decoder_args):
+    decoder = FrameDecoder(**decoder_args)
+    # First frame learns the stream resolution
+    decoder.decode(frames[0], width, height)
+    start = time.perf_counter()
+    for i in range(count):
+        frame = decoder.decode(frames[i % len(frames)], width, height)
+    elapsed = time.perf_counter() - start
+    result = {"backend": decoder.backend, "scale": decoder.scale, "decoded_shape": list(frame.shape),
+              "decode_ms": 1000 * elapsed / count}
+    result.update(decoder_args)
+    return result
+
+
+def run(frames, workers, count, width, height, grayscale):
+    painted = dict(count=0)
+
+    def frame_ready():
+        # Paint every image, as a GUI thread keeping up would
+        image = pipeline.get_latest_image()
+        if image is not None:
+            painted["count"] += 1
+            pipeline.release_image(image)
+
+    pipeline = FramePipeline(frame_ready_callback=frame_ready, workers=workers,
+                             decoder=FrameDecoder(grayscale=grayscale))
+    pipeline.set_target_size(width, height)
+    start = time.perf_counter()
+    # Keep exactly one frame per worker in flight, so no frame is dropped as stale
+    for i in range(0, count, workers):
+        for j in range(i, min(i + workers, count)):
+            pipeline.submit(frames[j % len(frames)])
+        wait_for_processing(pipeline)
+    elapsed = time.perf_counter() - start
+    pipeline.shutdown()
+    result = {
+        "workers": workers,
+        "fps": count / elapsed,
+        "painted": painted["count"],
+    }
+    result.update(pipeline.get_stats())
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the frame decode/convert pipeline")
+    parser.add_argument("-n", "--count", type=int, default=300)
+    parser.add_argument("--width", type=int, default=1280, help="Stream width")
+    parser.add_argument("--height", type=int, default=720, help="Stream height")
+    parser.add_argument("--display_width", type=int, default=480)
+    parser.add_argument("--display_height", type=int, default=320)
+    parser.add_argument("--max_workers", type=int, default=4)
+    parser.add_argument("--grayscale", action="store_true")
+    args = parser.parse_args()
+
+    frames = RobotServer.generate_frames(args.width, args.height, quality=80)
+    results = [
+        run(frames, workers, args.count, args.display_width, args.display_height, args.grayscale)
+        for workers in range(1, args.max_workers + 1)
+    ]
+    decoder_results = [
+        run_decode(frames, args.count, args.display_width, args.display_height, **decoder_args)
+        for decoder_args in [
+            dict(reduced=False, use_turbojpeg=False),
+            dict(reduced=True, use_turbojpeg=False),
+            dict(reduced=True, use_turbojpeg=False, grayscale=True),
+            dict(reduced=True, use_turbojpeg=True),
+        ]
+    ]
+    print(json.dumps({"decoder": decoder_results, "pipeline": results}, indent=2))
@@ -0,0 +1,97 @@
+import aiohttp
+import argparse
+import asyncio
+import gc
+import json
+import time
+import tracemalloc
+
+from benchmark.robot_server import RobotServer
+from client import Client
+from connection import close_sessions
+from video_stream import VideoStream
+
+
+async def legacy_connect(host, counter):
+    """Previous implementation: a new session per attempt, never closed, and a fixed 1 s delay"""
+    while True:
+        try:
+            session = aiohttp.ClientSession()
+            async with session.ws_connect(f"http://{host}/ws/video_stream") as ws:
+                await ws.send_str("start")
+                async for msg in ws:
+                    counter["frames"] += 1
+                    await ws.send_str("ready")
+        except asyncio.CancelledError:
+            raise
+        except:
+            pass
+        counter["reconnects"] += 1
+        await asyncio.sleep(1)
+
+
+def count_objects(*types):
+    gc.collect()
+    counts = {object_type.__name__: 0 for object_type in types}
+    for obj in gc.get_objects():
+        for object_type in types:
+            if isinstance(obj, object_type):
+                counts[object_type.__name__] += 1
+    return counts
+
+
+async def soak(mode, host, duration, sample_interval):
+    counter = dict(frames=0, reconnects=0)
+    if mode == "legacy":
+        tasks = [asyncio.ensure_future(legacy_connect(host, counter))]
+        client = video_stream = None
+    else:
+        client = Client(app=None, robot_config={})
+        video_stream = VideoStream(frame_callback=lambda data: counter.update(frames=counter["frames"] + 1))
+        tasks = [asyncio.ensure_future(client.connect(host)), asyncio.ensure_future(video_stream.connect(host))]
+
+    samples = []
+    start = time.monotonic()
+    while time.monotonic() - start < duration:
+        await asyncio.sleep(sample_interval)
+        sample = {"time": time.monotonic() - start, "traced_kb": tracemalloc.get_traced_memory()[0] / 1024}
+        sample.update(count_objects(aiohttp.ClientSession, aiohttp.TCPConnector))
+        samples.append(sample)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await close_sessions()
+
+    result = {
+        "mode": mode,
+        "frames": counter["frames"],
+        "samples": samples,
+        # Memory growth over the second half of the run, once caches are warm
+        "traced_kb_growth": samples[-1]["traced_kb"] - samples[len(samples) // 2]["traced_kb"],
+    }
+    if mode == "legacy":
+        result["reconnects"] = counter["reconnects"]
+    else:
+        result["robot"] = client.reconnector.get_stats()
+        result["video_stream"] = video_stream.reconnector.get_stats()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Soak test of the reconnections against a stand-in robot dropping "
+                                                 "its connections")
+    parser.add_argument("-p", "--port", type=int, default=8767)
+    parser.add_argument("--drop_interval", type=float, default=0.5, help="Time before the server drops a connection")
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--sample_interval", type=float, default=5.0)
+    args = parser.parse_args()
+
+    server = RobotServer(port=args.port, drop_interval=args.drop_interval)
+    server.start()
+    tracemalloc.start()
+    results = [asyncio.run(soak(mode, server.address, args.duration, args.sample_interval))
+               for mode in ["legacy", "shared_session"]]
+    server.stop()
+    for result in results:
+        print(f"{result['mode']}: {result['traced_kb_growth']:.0f} kB growth over the second half")
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,91 @@
+import argparse
+import copy
+import json
+import os
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+
+from robot_config_manager import RobotConfigManagerPopup
+
+
+class FakeClient(object):
+    """Records the messages sent by the popup, the configuration replies are given by the benchmark"""
+
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, message):
+        self.messages.append(message)
+
+    def register_consumer(self, topic, consumer):
+        pass
+
+
+def synthetic_config(size, categories=10):
+    config = {}
+    for i in range(size):
+        kind = i % 3
+        config[f"setting_{i}"] = {
+            "category": f"category_{i % categories}",
+            "type": "bool" if kind == 0 else "str",
+            "default": False if kind == 0 else "a",
+            "value": False if kind == 0 else "a",
+        }
+        if kind == 1:
+            config[f"setting_{i}"]["choices"] = ["a", "b", "c"]
+    return config
+
+
+def time_update(popup, app, message, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        popup.update_config(message)
+        app.processEvents()
+    return 1000 * (time.perf_counter() - start) / repeat
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Robot configuration popup update cost")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000], help="Configuration sizes")
+    parser.add_argument("--repeat", type=int, default=20, help="Updates timed per scenario")
+    args = parser.parse_args()
+
+    app = QApplication([])
+    results = []
+    for size in args.sizes:
+        popup = RobotConfigManagerPopup(client=FakeClient())
+        config = synthetic_config(size)
+        start = time.perf_counter()
+        popup.update_config(dict(config=config, success=True, action="get"))
+        app.processEvents()
+        first_render_ms = 1000 * (time.perf_counter() - start)
+
+        # An edit in progress on another key must survive the updates
+        edited = popup.entries["setting_2"]
+        edited.set_widget_value("edited")
+
+        unchanged_ms = time_update(popup, app, dict(config=config, success=True, action="get"), args.repeat)
+        changed = copy.deepcopy(config)
+        changed["setting_5"]["value"] = "c"
+        changed_ms = time_update(popup, app, dict(config=changed, success=True, action="update"), args.repeat)
+        added = copy.deepcopy(changed)
+        added["setting_new"] = {"category": "category_0", "type": "int", "default": 0, "value": 1}
+        added_ms = time_update(popup, app, dict(config=added, success=True, action="update"), 1)
+        removed_ms = time_update(popup, app, dict(config=changed, success=True, action="delete"), 1)
+
+        results.append({
+            "size": size,
+            "first_render_ms": first_render_ms,
+            "unchanged_update_ms": unchanged_ms,
+            "one_changed_key_ms": changed_ms,
+            "one_added_key_ms": added_ms,
+            "one_removed_key_ms": removed_ms,
+            "edit_preserved": edited.get_widget_value() == "edited",
+        })
+        popup.close()
+        popup.deleteLater()
+        app.processEvents()
+    print(json.dumps(results, indent=2))
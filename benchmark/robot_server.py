@@ -0,0 +1,187 @@
+import asyncio
+import cv2
+import json
+import numpy as np
+import threading
+import time
+
+from aiohttp import web, WSMsgType
+
+from frame_metrics import build_frame_header
+from message_codec import MessageCodec
+
+
+class RobotServer(object):
+    """Local stand-in for the PiRobot websocket server"""
+
+    def __init__(self, host="127.0.0.1", port=8765, robot_name="StandInRobot",
+                 width=640, height=480, quality=80, fps=30, latency=0.0, window_mode=True,
+                 embed_timestamp=True, compact_encoding=True, drop_interval=None):
+        self.host = host
+        self.port = port
+        self.robot_name = robot_name
+        # Video stream settings, latency is the injected round trip time in seconds
+        self.fps = fps
+        self.latency = latency
+        self.window_mode = window_mode
+        # Add the frame sequence number and send time to the frames, for glass to glass latency
+        self.embed_timestamp = embed_timestamp
+        self.compact_encoding = compact_encoding
+        # Close every websocket after this many seconds, to simulate a flaky link
+        self.drop_interval = drop_interval
+        self.codec = MessageCodec()
+        self.frames = self.generate_frames(width, height, quality)
+        self.loop = None
+        self.runner = None
+        self.thread = None
+        self.started = threading.Event()
+
+        # Counters
+        self.messages_received = 0
+        self.bytes_received = 0
+        self.last_messages = {}
+        self.frames_sent = 0
+        self.connections = 0
+        self.dropped_connections = 0
+
+    @staticmethod
+    def generate_frames(width, height, quality, count=30):
+        """Pre-encoded synthetic JPEG frames with a moving bar"""
+        frames = []
+        gradient = np.tile(np.linspace(0, 255, width, dtype=np.uint8), (height, 1))
+        for i in range(count):
+            image = cv2.merge([gradient, np.flipud(gradient), np.full_like(gradient, (i * 8) % 256)])
+            x = int(i * width / count)
+            cv2.rectangle(image, (x, 0), (x + width // 20, height), (255, 255, 255), -1)
+            frames.append(cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+        return frames
+
+    @property
+    def address(self):
+        return f"{self.host}:{self.port}"
+
+    def create_app(self):
+        app = web.Application()
+        app.router.add_get("/ws/robot", self.robot_handler)
+        app.router.add_get("/ws/video_stream", self.video_handler)
+        return app
+
+    def prepare_drop(self, ws):
+        self.connections += 1
+        if self.drop_interval is not None:
+            asyncio.get_running_loop().call_later(self.drop_interval, self.drop, ws)
+
+    def drop(self, ws):
+        if not ws.closed:
+            self.dropped_connections += 1
+            asyncio.ensure_future(ws.close())
+
+    async def robot_handler(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.prepare_drop(ws)
+        await ws.send_json(dict(topic="status", message=dict(robot_name=self.robot_name, config={})))
+        async for msg in ws:
+            if msg.type == WSMsgType.TEXT:
+                message = json.loads(msg.data)
+                if message.get("topic") == "encoding":
+                    if self.compact_encoding and MessageCodec.FORMAT in message["message"].get("formats", []):
+                        await ws.send_json(dict(topic="encoding", message=dict(format=MessageCodec.FORMAT)))
+                    continue
+                self.bytes_received += len(msg.data)
+                self.on_message(message)
+            elif msg.type == WSMsgType.BINARY:
+                self.bytes_received += len(msg.data)
+                self.on_message(dict(topic="robot", message=self.codec.decode(msg.data)))
+        return ws
+
+    async def video_handler(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.prepare_drop(ws)
+        state = dict(credits=0, wakeup=asyncio.Event())
+        sender_task = asyncio.ensure_future(self.send_frames(ws, state))
+        loop = asyncio.get_running_loop()
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.TEXT:
+                    # Simulate the network round trip on the control messages
+                    loop.call_later(self.latency, self.on_video_control, ws, state, msg.data)
+        finally:
+            sender_task.cancel()
+        return ws
+
+    def on_video_control(self, ws, state, data):
+        command = data.split()
+        if command[0] in ["start", "ready"]:
+            state["credits"] += 1
+        elif command[0] == "window" and self.window_mode:
+            state["credits"] += int(command[1])
+            asyncio.ensure_future(ws.send_str(data))
+        elif command[0] == "credit" and self.window_mode:
+            state["credits"] += int(command[1])
+        state["wakeup"].set()
+
+    async def send_frames(self, ws, state):
+        frame_interval = 1.0 / self.fps
+        next_frame_ts = time.monotonic()
+        while not ws.closed:
+            await state["wakeup"].wait()
+            state["wakeup"].clear()
+            while state["credits"] > 0 and not ws.closed:
+                delay = next_frame_ts - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                next_frame_ts = max(next_frame_ts + frame_interval, time.monotonic())
+                state["credits"] -= 1
+                frame = self.frames[self.frames_sent % len(self.frames)]
+                if self.embed_timestamp:
+                    frame = frame[:2] + build_frame_header(self.frames_sent, time.time()) + frame[2:]
+                await ws.send_bytes(frame)
+                self.frames_sent += 1
+
+    def on_message(self, message):
+        self.messages_received += 1
+        if isinstance(message, dict):
+            robot_message = message.get("message", {})
+            self.last_messages[(robot_message.get("type"), robot_message.get("action"))] = robot_message
+
+    def reset_counters(self):
+        self.messages_received = 0
+        self.bytes_received = 0
+        self.last_messages = {}
+        self.frames_sent = 0
+
+    async def _start(self):
+        self.runner = web.AppRunner(self.create_app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.started.set()
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self._start())
+        self.loop.run_forever()
+        self.loop.run_until_complete(self.runner.cleanup())
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.started.wait()
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop = None
+
+
+if __name__ == "__main__":
+    server = RobotServer(host="0.0.0.0", port=8080)
+    server.start()
+    print(f"Stand-in robot listening on {server.address}")
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
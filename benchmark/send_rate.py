@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from benchmark.robot_server import RobotServer
+from client import Client
+from sender import MessageSender
+
+
+def drive_message(i):
+    return dict(type="drive", action="move", args=dict(left_orientation="F",
+                                                       left_speed=i % 100,
+                                                       right_orientation="F",
+                                                       right_speed=(i * 7) % 100,
+                                                       duration=30,
+                                                       distance=None,
+                                                       rotation=None,
+                                                       auto_stop=False,
+                                                       ))
+
+
+def legacy_send(client, message):
+    """Previous implementation: one event loop created per message"""
+    async def _send_message():
+        await client.ws.send_json(dict(topic="robot", message=message))
+    try:
+        asyncio.run(_send_message())
+    except Exception:
+        pass
+
+
+def start_client(address):
+    os.makedirs(os.path.join(Path.home(), ".pirobot-remote"), exist_ok=True)
+    client = Client(app=None, robot_config={}, max_command_rate=None)
+    loop = asyncio.new_event_loop()
+    loop.create_task(client.connect(address))
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    while not client.sender.is_attached():
+        time.sleep(0.01)
+    return client
+
+
+def wait_for_delivery(server, client, expected, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if client.sender.depth() == 0 and server.messages_received >= expected():
+            break
+        time.sleep(0.001)
+
+
+def run(server, client, mode, count, timeout):
+    if mode == "legacy":
+        send = lambda message: legacy_send(client, message)
+        expected = lambda: count
+    else:
+        send = client.send_message
+        sent_before = client.sender.sent
+        expected = lambda: client.sender.sent - sent_before
+    server.reset_counters()
+    start = time.perf_counter()
+    for i in range(count):
+        send(drive_message(i))
+    produced = time.perf_counter() - start
+    wait_for_delivery(server, client, expected, timeout)
+    elapsed = time.perf_counter() - start
+    return {
+        "mode": mode,
+        "messages": count,
+        "received": server.messages_received,
+        "producer_us_per_message": 1e6 * produced / count,
+        "elapsed_s": elapsed,
+        "messages_per_sec": server.messages_received / elapsed,
+    }
+
+
+def run_stick(server, client, event_rate, duration, timeout):
+    """Simulate a stick sweep emitting axis events at event_rate"""
+    server.reset_counters()
+    sent_before = client.sender.sent
+    suppressed_before = client.sender.suppressed + client.sender.superseded
+    events = int(event_rate * duration)
+    start = time.perf_counter()
+    for i in range(events):
+        # Slow sweep, consecutive events often map to the same speed
+        client.send_message(drive_message(int(100 * i / events)))
+        time.sleep(1.0 / event_rate)
+    client.send_message(dict(type="drive", action="stop"))
+    wait_for_delivery(server, client, lambda: client.sender.sent - sent_before, timeout)
+    elapsed = time.perf_counter() - start
+    return {
+        "mode": "stick",
+        "events": events + 1,
+        "received": server.messages_received,
+        "suppressed": client.sender.suppressed + client.sender.superseded - suppressed_before,
+        "bytes_received": server.bytes_received,
+        "elapsed_s": elapsed,
+        "stop_received": server.last_messages.get(("drive", "stop")) is not None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark command sending rate against a stand-in robot")
+    parser.add_argument("-n", "--count", type=int, default=5000)
+    parser.add_argument("-p", "--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--event_rate", type=int, default=200, help="Stick events per second")
+    parser.add_argument("--max_rate", type=int, default=20, help="Maximum setpoints per second")
+    args = parser.parse_args()
+
+    server = RobotServer(port=args.port)
+    server.start()
+    client = start_client(server.address)
+    # Large queue so that the benchmark measures throughput, not drops
+    client.sender.max_size = args.count
+
+    # Raw throughput, without setpoint coalescing
+    client.sender.COALESCED_MESSAGES = set()
+    results = [run(server, client, mode, args.count, args.timeout) for mode in ["legacy", "queue"]]
+    # Uplink traffic for a stick sweep, with setpoint coalescing
+    client.sender.COALESCED_MESSAGES = MessageSender.COALESCED_MESSAGES
+    client.sender.max_rate = args.max_rate
+    results.append(run_stick(server, client, args.event_rate, 2.0, args.timeout))
+    results.append({"sender_stats": client.sender.get_stats()})
+    print(json.dumps(results, indent=2))
+    server.stop()
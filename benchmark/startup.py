@@ -0,0 +1,41 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+
+from startup_report import run_cold_start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time from starting main.py to its window being shown")
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1500, help="Target process time to the window (ms)")
+    parser.add_argument("--host", type=str, help="Also connect to this host, as main.py --host")
+    args = parser.parse_args()
+
+    # No display is needed
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    main_args = [] if args.host is None else ["--host", args.host]
+    runs = [run_cold_start(main_args, env=env) for _ in range(args.runs)]
+    failed = [run for run in runs if run["returncode"] != 0 or run["window_shown_ms"] is None]
+    if failed:
+        print(f"{len(failed)} runs failed to show the window", file=sys.stderr)
+        sys.exit(2)
+
+    process_ms = [run["process_ms"] for run in runs]
+    result = {
+        # The first run reads the modules from disk, the next ones from the page cache
+        "first_run_ms": process_ms[0],
+        "median_ms": statistics.median(process_ms),
+        "window_shown_ms": statistics.median(run["window_shown_ms"] for run in runs),
+        "budget_ms": args.budget,
+        "within_budget": statistics.median(process_ms) <= args.budget,
+        "deferred_modules_imported": runs[0]["deferred_modules_imported"],
+        "slowest_imports": [
+            {key: entry[key] for key in ["module", "cumulative_ms"]}
+            for entry in sorted(runs[-1]["imports"], key=lambda entry: entry["cumulative_ms"], reverse=True)
+            if entry["level"] == 0
+        ][:10],
+    }
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["within_budget"] and not result["deferred_modules_imported"] else 1)
@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import cv2
+import json
+import numpy as np
+import time
+
+from benchmark.robot_server import RobotServer
+from video_stream import VideoStream
+
+
+def decode(data):
+    cv2.imdecode(np.frombuffer(data, dtype="byte"), cv2.IMREAD_UNCHANGED)
+
+
+async def measure(video_stream, frame_counter, address, duration):
+    task = asyncio.ensure_future(video_stream.connect(address))
+    # Skip the connection and negotiation
+    await asyncio.sleep(1.0)
+    frames_before = frame_counter["count"]
+    start = time.perf_counter()
+    await asyncio.sleep(duration)
+    frames = frame_counter["count"] - frames_before
+    elapsed = time.perf_counter() - start
+    task.cancel()
+    return frames / elapsed
+
+
+def run(server, window, duration):
+    frame_counter = dict(count=0)
+
+    def frame_callback(data):
+        decode(data)
+        frame_counter["count"] += 1
+
+    video_stream = VideoStream(frame_callback=frame_callback, window=window)
+    fps = asyncio.run(measure(video_stream, frame_counter, server.address, duration))
+    result = {
+        "window_mode": server.window_mode,
+        "requested_window": window,
+        "negotiated_mode": video_stream.mode,
+        "latency_ms": 1000 * server.latency,
+        "fps": fps,
+    }
+    if video_stream.flow_control is not None:
+        result["final_window"] = video_stream.flow_control.window
+        rtt = video_stream.flow_control.get_rtt()
+        result["measured_rtt_ms"] = None if rtt is None else 1000 * rtt
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the video stream frame rate against a stand-in robot")
+    parser.add_argument("-p", "--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.06, help="Injected round trip time in seconds")
+    parser.add_argument("--fps", type=int, default=30, help="Camera frame rate of the stand-in robot")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    server = RobotServer(port=args.port, width=args.width, height=args.height, fps=args.fps, latency=args.latency)
+    server.start()
+    results = [
+        # Lock-step protocol
+        run(server, window=None, duration=args.duration),
+        # Windowed protocol
+        run(server, window=4, duration=args.duration),
+    ]
+    # Server without windowed mode, the client must fall back to lock-step
+    server.window_mode = False
+    results.append(run(server, window=4, duration=args.duration))
+    print(json.dumps(results, indent=2))
+    server.stop()
@@ -0,0 +1,54 @@
+import argparse
+import json
+import math
+import time
+
+from telemetry import TelemetryBuffer, flatten_values, lttb_decimate, minmax_decimate
+
+
+def telemetry_message(i, rate):
+    t = i / rate
+    return {
+        "battery": {"voltage": 7.4 - t * 1e-5, "current": 0.8 + 0.3 * math.sin(t)},
+        "distance": 100 + 50 * math.sin(t / 3),
+        "moving": i % 200 < 100,
+        "robot_name": "robot",
+    }
+
+
+def time_call(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return 1000 * (time.perf_counter() - start) / repeat, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Telemetry append and plot decimation cost")
+    parser.add_argument("--rate", type=int, default=100, help="Telemetry messages per second")
+    parser.add_argument("--hours", type=float, default=1.0, help="Duration of telemetry stored")
+    parser.add_argument("--points", type=int, default=800, help="Points drawn, about the plot width")
+    args = parser.parse_args()
+
+    samples = int(args.rate * args.hours * 3600)
+    telemetry = TelemetryBuffer(capacity=samples)
+    messages = [telemetry_message(i, args.rate) for i in range(1000)]
+    start = time.perf_counter()
+    for i in range(samples):
+        telemetry.append(flatten_values(messages[i % len(messages)]), timestamp=i / args.rate)
+    append_us = 1e6 * (time.perf_counter() - start) / samples
+
+    results = {"samples": samples, "append_us": append_us, "telemetry": telemetry.get_stats(), "render": []}
+    for window in [60, 600, None]:
+        series_ms, (t, y) = time_call(lambda: telemetry.get_series("battery.current", window), 10)
+        minmax_ms, decimated = time_call(lambda: minmax_decimate(t, y, args.points // 2), 10)
+        lttb_ms, _ = time_call(lambda: lttb_decimate(t, y, args.points), 3)
+        results["render"].append({
+            "window_s": window,
+            "samples": len(t),
+            "points_drawn": len(decimated[0]),
+            "get_series_ms": series_ms,
+            "minmax_ms": minmax_ms,
+            "lttb_ms": lttb_ms,
+        })
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,188 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+# Paint into offscreen QPixmaps, no display is needed
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from benchmark.robot_server import RobotServer
+from frame_decoder import FrameDecoder
+from frame_metrics import FrameMetrics
+from frame_pipeline import FramePipeline, StageTimer
+from video_stream import VideoStream
+
+
+def run_stream(loop, video_stream, address):
+    asyncio.set_event_loop(loop)
+    loop.create_task(video_stream.connect(address))
+    loop.run_forever()
+
+
+def run_client(args):
+    """Client side of a scenario, run in its own process so CPU and memory only account for the client"""
+    from PyQt5.QtGui import QGuiApplication, QPixmap
+
+    # Needed by QPixmap, must stay alive for the whole run
+    qt_app = QGuiApplication(sys.argv[:1])
+    frame_ready = threading.Event()
+    pipeline = FramePipeline(frame_ready_callback=frame_ready.set, workers=args.decode_workers,
+                             decoder=FrameDecoder(grayscale=args.grayscale))
+    pipeline.set_target_size(args.display_width, args.display_height)
+    # Wired as in App
+    video_stream = VideoStream(frame_callback=pipeline.submit, window=args.video_window or None,
+                               decode_time=pipeline.get_frame_time)
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=run_stream, args=(loop, video_stream, args.client), daemon=True).start()
+
+    def paint_until(end_time):
+        """Stand-in for the GUI thread: paint every image made ready by the pipeline"""
+        painted = 0
+        while time.monotonic() < end_time:
+            qt_app.processEvents()
+            if not frame_ready.wait(0.1):
+                continue
+            frame_ready.clear()
+            image = pipeline.get_latest_image()
+            if image is None:
+                continue
+            pixmap = QPixmap.fromImage(image)
+            pipeline.release_image(image)
+            pipeline.frame_painted()
+            if not pixmap.isNull():
+                painted += 1
+        return painted
+
+    # Connection, negotiation and first frames are not measured
+    paint_until(time.monotonic() + args.warmup)
+    pipeline.metrics = FrameMetrics()
+    pipeline.timers = {stage: StageTimer() for stage in FramePipeline.STAGES}
+    submitted = pipeline.submitted
+
+    cpu_start = time.process_time()
+    start = time.monotonic()
+    painted = paint_until(start + args.duration)
+    elapsed = time.monotonic() - start
+    cpu = time.process_time() - cpu_start
+    received = pipeline.submitted - submitted
+
+    loop.call_soon_threadsafe(loop.stop)
+    pipeline.shutdown()
+    stats = pipeline.get_stats()
+    return {
+        "received_fps": received / elapsed,
+        "painted_fps": painted / elapsed,
+        "cpu_percent": 100 * cpu / elapsed,
+        # Linux reports kilobytes
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "latency_ms": pipeline.metrics.get_summary(),
+        "stages_ms": {stage: stats[stage] for stage in FramePipeline.STAGES},
+        "decoder": stats["decoder"],
+        "decode_scale": stats["decode_scale"],
+        "dropped": {
+            key: stats[key] for key in ["dropped_stale", "dropped_out_of_order", "dropped_paint", "errors"]
+        },
+        "video_mode": video_stream.mode,
+    }
+
+
+def run_scenario(args, port, width, height, quality, fps, latency):
+    server = RobotServer(port=port, width=width, height=height, quality=quality, fps=fps, latency=latency)
+    server.start()
+    try:
+        command = [
+            sys.executable, "-m", "benchmark.video", "--client", server.address,
+            "--duration", str(args.duration), "--warmup", str(args.warmup),
+            "--display_width", str(args.display_width), "--display_height", str(args.display_height),
+            "--video_window", str(args.video_window), "--decode_workers", str(args.decode_workers),
+        ]
+        if args.grayscale:
+            command.append("--grayscale")
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+    finally:
+        server.stop()
+    scenario = {
+        "name": f"{width}x{height}-q{quality}-{fps}fps-{int(1000 * latency)}ms",
+        "width": width,
+        "height": height,
+        "quality": quality,
+        "fps": fps,
+        "latency_ms": 1000 * latency,
+        "frame_bytes": sum(len(frame) for frame in server.frames) // len(server.frames),
+    }
+    scenario.update(result)
+    return scenario
+
+
+def compare(results, baseline_path):
+    """Relative change of the main metrics against a previous run"""
+    with open(baseline_path) as baseline_file:
+        baseline = {scenario["name"]: scenario for scenario in json.load(baseline_file)["scenarios"]}
+    comparison = {}
+    for scenario in results["scenarios"]:
+        previous = baseline.get(scenario["name"])
+        if previous is None:
+            continue
+        comparison[scenario["name"]] = {
+            "painted_fps": scenario["painted_fps"] / max(previous["painted_fps"], 1e-9),
+            "cpu_percent": scenario["cpu_percent"] / max(previous["cpu_percent"], 1e-9),
+            "peak_rss_mb": scenario["peak_rss_mb"] / max(previous["peak_rss_mb"], 1e-9),
+            "total_p50": (scenario["latency_ms"]["total"]["p50"] or 0) / max(
+                previous["latency_ms"]["total"]["p50"] or 0, 1e-9
+            ),
+        }
+    return comparison
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End to end video benchmark of the client against a stand-in robot")
+    parser.add_argument("--resolution", nargs="+", default=["640x480", "1280x720"], help="WIDTHxHEIGHT")
+    parser.add_argument("--quality", type=int, nargs="+", default=[80])
+    parser.add_argument("--fps", type=int, nargs="+", default=[30])
+    parser.add_argument("--latency", type=float, nargs="+", default=[0.0], help="Injected round trip time (s)")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--display_width", type=int, default=800)
+    parser.add_argument("--display_height", type=int, default=600)
+    parser.add_argument("-w", "--video_window", type=int, default=4)
+    parser.add_argument("-d", "--decode_workers", type=int, default=2)
+    parser.add_argument("-g", "--grayscale", action="store_true")
+    parser.add_argument("-p", "--port", type=int, default=8770)
+    parser.add_argument("-o", "--output", type=str, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", type=str, help="Results of a previous run to compare with")
+    parser.add_argument("--client", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.client is not None:
+        print(json.dumps(run_client(args)))
+        sys.exit(0)
+
+    scenarios = []
+    for i, (resolution, quality, fps, latency) in enumerate(
+            itertools.product(args.resolution, args.quality, args.fps, args.latency)):
+        width, height = [int(value) for value in resolution.split("x")]
+        scenarios.append(run_scenario(args, args.port + i, width, height, quality, fps, latency))
+    results = {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "settings": {
+            key: getattr(args, key)
+            for key in ["duration", "display_width", "display_height", "video_window", "decode_workers", "grayscale"]
+        },
+        "scenarios": scenarios,
+    }
+    if args.baseline is not None:
+        results["comparison"] = compare(results, args.baseline)
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+    print(json.dumps(results, indent=2))
@@ -1,16 +1,18 @@
-import aiohttp
 import asyncio
-import json
 import queue
 import traceback
 
+from connection import Reconnector, get_session
+from dispatcher import MessageDispatcher
 from input_config_manager import InputConfigManager
+from message_codec import MessageCodec
+from sender import MessageSender
 
 
 class Client(object):
     message_queue = queue.Queue()
 
-    def __init__(self, app, robot_config):
+    def __init__(self, app, robot_config, max_command_rate=20, compact_encoding=True):
         self.app = app
         self.motor_slow_mode = False
         self.lock_camera = False
@@ -18,7 +20,11 @@ class Client(object):
         self.ws = None
         self.input_config_manager = InputConfigManager(robot_config=robot_config)
         self.axis_positions = {}
-        self.consumers = {}
+        self.dispatcher = MessageDispatcher()
+        self.sender = MessageSender(max_rate=max_command_rate)
+        self.reconnector = Reconnector()
+        self.compact_encoding = compact_encoding
+        self.register_consumer("encoding", self.encoding_callback)
 
     def is_connected(self):
         return self.ws is not None
@@ -32,6 +38,10 @@ class Client(object):
             self.app.open_play_message_window(destination="lcd")
         elif action_id == "motor_slow_mode":
             self.motor_slow_mode = not self.motor_slow_mode
+        elif action_id == "instant_replay":
+            self.app.replay_signal.emit("play")
+        elif action_id == "save_replay":
+            self.app.replay_signal.emit("save")
         elif action_id == "lock_camera":
             self.lock_camera = not self.lock_camera
             if not self.lock_camera:
@@ -78,26 +88,40 @@ class Client(object):
 
     async def connect(self, host):
         self.host = host
+        url = f"http://{host}/ws/robot"
         while True:
             try:
-                url = f"http://{host}/ws/robot"
-                session = aiohttp.ClientSession()
-                async with session.ws_connect(url) as ws:
+                async with get_session(host).ws_connect(url) as ws:
                     print(f"Connected to {url}")
+                    self.reconnector.on_connected()
                     self.ws = ws
-                    async for msg in ws:
-                        message = json.loads(msg.data)
-                        for consumer in self.consumers.get(message["topic"], []):
-                            consumer(message["message"])
+                    sender_task = asyncio.ensure_future(self.sender.run(ws))
+                    try:
+                        if self.compact_encoding:
+                            # Servers not supporting it don't answer, JSON is kept
+                            await ws.send_json(dict(topic="encoding", message=dict(formats=[MessageCodec.FORMAT])))
+                        async for msg in ws:
+                            # Consumers run on their own threads
+                            await self.dispatcher.dispatch(msg.data)
+                    finally:
+                        sender_task.cancel()
+                        self.sender.detach()
+                        self.ws = None
+            except asyncio.CancelledError:
+                raise
             except:
                 traceback.print_exc()
+            self.reconnector.on_disconnected()
             print(f"Unable to connect to {url}, reconnecting")
-            await asyncio.sleep(1)
+            await asyncio.sleep(self.reconnector.next_delay())
+
+    def encoding_callback(self, message):
+        if message.get("format") == MessageCodec.FORMAT:
+            print("Using compact encoding for drive and camera messages")
+            self.sender.codec = MessageCodec()
 
     def register_consumer(self, message_topic, consumer):
-        if message_topic not in self.consumers:
-            self.consumers[message_topic] = []
-        self.consumers[message_topic].append(consumer)
+        self.dispatcher.register_consumer(message_topic, consumer)
 
     def gamepad_absolute_axis_callback(self, joystick, axis):
         group = self.input_config_manager.get_group_for_axis(joystick, axis)
@@ -105,6 +129,17 @@ class Client(object):
             axis_position = self.input_config_manager.get_axis_position_for_group(joystick, group)
             self.run_axis_action(group, axis_position.get("x", 0.0), axis_position.get("y", 0.0))
 
+    def gamepad_axis_snapshot_callback(self, joystick, axis_values, changed_axes):
+        # One action per group, whatever the number of axes of the group that moved
+        groups = []
+        for axis in changed_axes:
+            group = self.input_config_manager.get_group_for_axis(joystick, axis)
+            if group is not None and group not in groups:
+                groups.append(group)
+        for group in groups:
+            axis_position = self.input_config_manager.get_axis_position_for_group(joystick, group, axis_values)
+            self.run_axis_action(group, axis_position.get("x", 0.0), axis_position.get("y", 0.0))
+
     def gamepad_hat_callback(self, joystick, hat, x_pos, y_pos):
         group = self.input_config_manager.get_group_for_hat(joystick, hat)
         if group is not None:
@@ -151,8 +186,8 @@ class Client(object):
                                                                           )))
 
     def run_axis_action(self, group, x_pos, y_pos):
-        x_pos_percent = int(x_pos * 100)
-        y_pos_percent = int(y_pos * 100)
+        x_pos_percent = int(round(x_pos * 100))
+        y_pos_percent = int(round(y_pos * 100))
         if group == "drive":
             self.drive_robot(x_pos_percent, y_pos_percent)
         elif group == "camera":
@@ -177,13 +212,8 @@ class Client(object):
                 self.run_action(action)
 
     def send_message(self, message):
-        asyncio.run(self._send_message(message))
-
-    async def _send_message(self, message):
-        try:
-            await self.ws.send_json(dict(topic="robot", message=message))
-        except:
-            print("Unable to send message")
+        # Thread safe, the message is sent by the connection event loop
+        self.sender.put(message)
 
     def play_message(self, message, destination="lcd"):
         socket_message = {
@@ -0,0 +1,276 @@
+import json
+import os
+import tempfile
+import threading
+
+
+class InputConfigSnapshot(object):
+    """Parsed input configuration files, shared between the managers: must not be modified"""
+
+    __slots__ = ["fingerprint", "actions", "keyboard_mapping", "gamepad_mapping", "consolidated"]
+
+    def __init__(self, fingerprint, actions, keyboard_mapping, gamepad_mapping, consolidated=False):
+        self.fingerprint = fingerprint
+        self.actions = actions
+        self.keyboard_mapping = keyboard_mapping
+        self.gamepad_mapping = gamepad_mapping
+        # Mappings loaded from the single file store
+        self.consolidated = consolidated
+
+
+class ConfigStore(object):
+    """Process-wide cache of the configuration files, a file is only parsed again when its mtime or size changed"""
+
+    # Single file holding the keyboard and all the gamepad mappings, used instead of one file per mapping
+    CONSOLIDATED_FILE = "input.config.json"
+
+    instance = None
+    instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        with cls.instance_lock:
+            if cls.instance is None:
+                cls.instance = cls()
+            return cls.instance
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        # Path: (mtime, size, parsed content)
+        self.files = {}
+        self.snapshots = {}
+        # Path: (version, serialized content), written in order by the writer thread, the latest content wins
+        self.pending_writes = {}
+        # Path: (version, parsed content) of the files not written yet, given to the readers in place of the file
+        self.pending_contents = {}
+        self.write_version = 0
+        self.writing = 0
+        self.write_condition = threading.Condition()
+        self.writer_thread = None
+
+        # Counters
+        self.reads = 0
+        self.hits = 0
+        self.writes = 0
+        self.write_errors = 0
+
+    @staticmethod
+    def get_stat_key(path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def exists(self, path):
+        return path in self.pending_contents or os.path.isfile(path)
+
+    def load_json(self, path):
+        """Parsed content of the file, shared: must not be modified"""
+        with self.lock:
+            pending = self.pending_contents.get(path)
+            if pending is not None:
+                self.hits += 1
+                return pending[1]
+            stat_key = self.get_stat_key(path)
+            cached = self.files.get(path)
+            if cached is not None and cached[0] == stat_key:
+                self.hits += 1
+                return cached[1]
+            with open(path) as config_file:
+                data = json.load(config_file)
+            self.reads += 1
+            self.files[path] = (stat_key, data)
+            return data
+
+    def write_json(self, path, data):
+        self.write_text(path, json.dumps(data))
+
+    def write_text(self, path, text, version=None):
+        """Write the file atomically: a crash leaves either the previous or the new content, never a truncated file"""
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as config_file:
+                config_file.write(text)
+                config_file.flush()
+                os.fsync(config_file.fileno())
+            os.replace(temp_path, path)
+        except:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        with self.lock:
+            self.writes += 1
+            pending = self.pending_contents.get(path)
+            if version is not None and pending is not None and pending[0] == version:
+                # Content already parsed by write_json_async
+                del self.pending_contents[path]
+                self.files[path] = (self.get_stat_key(path), pending[1])
+            else:
+                # Parsed again on next read
+                self.files.pop(path, None)
+
+    def write_json_async(self, path, data):
+        """Serialize the content now, the file is written by the writer thread
+
+        The readers get the new content right away, without waiting for the file to be written.
+        """
+        text = json.dumps(data)
+        with self.lock:
+            self.write_version += 1
+            version = self.write_version
+            # Parsed back, so the content shared with the readers isn't the one the caller may still modify
+            self.pending_contents[path] = (version, json.loads(text))
+        with self.write_condition:
+            self.pending_writes.pop(path, None)
+            self.pending_writes[path] = (version, text)
+            if self.writer_thread is None:
+                self.writer_thread = threading.Thread(target=self.run_writer, name="config_writer", daemon=True)
+                self.writer_thread.start()
+            self.write_condition.notify_all()
+
+    def run_writer(self):
+        while True:
+            with self.write_condition:
+                while not self.pending_writes:
+                    self.write_condition.wait()
+                path = next(iter(self.pending_writes))
+                version, text = self.pending_writes.pop(path)
+                self.writing += 1
+            try:
+                self.write_text(path, text, version)
+            except:
+                self.write_errors += 1
+                print(f"Unable to write config file {path}")
+                with self.lock:
+                    # Back to the content of the file
+                    if self.pending_contents.get(path, (None,))[0] == version:
+                        del self.pending_contents[path]
+            with self.write_condition:
+                self.writing -= 1
+                self.write_condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait for the pending writes, needed before exiting, returns False on timeout"""
+        with self.write_condition:
+            return self.write_condition.wait_for(lambda: not self.pending_writes and not self.writing, timeout)
+
+    def get_input_config_files(self, config_path, user_config_path):
+        files = [os.path.join(config_path, "actions.json")]
+        for path in [user_config_path, config_path]:
+            files.append(os.path.join(path, "keyboard.config.json"))
+        files.append(os.path.join(user_config_path, self.CONSOLIDATED_FILE))
+        filenames = set(os.listdir(user_config_path)) if os.path.isdir(user_config_path) else set()
+        with self.lock:
+            # Including the files not written yet
+            filenames.update(
+                os.path.basename(path) for path in self.pending_contents
+                if os.path.dirname(path) == user_config_path
+            )
+        files += sorted(
+            os.path.join(user_config_path, filename) for filename in filenames
+            if filename.startswith("gamepad.") and filename.endswith(".config.json")
+        )
+        return files
+
+    def get_fingerprint(self, config_path, user_config_path):
+        """Changes whenever one of the input configuration files is added, removed or modified"""
+        fingerprint = []
+        for path in self.get_input_config_files(config_path, user_config_path):
+            pending = self.pending_contents.get(path)
+            if pending is not None:
+                fingerprint.append((path, ("pending", pending[0])))
+                continue
+            try:
+                fingerprint.append((path, self.get_stat_key(path)))
+            except OSError:
+                continue
+        return tuple(fingerprint)
+
+    def get_input_config(self, config_path, user_config_path):
+        """Snapshot of the actions and mappings, the same object is returned as long as no file changed"""
+        with self.lock:
+            key = (config_path, user_config_path)
+            fingerprint = self.get_fingerprint(config_path, user_config_path)
+            snapshot = self.snapshots.get(key)
+            if snapshot is not None and snapshot.fingerprint == fingerprint:
+                return snapshot
+
+            actions = self.load_json(os.path.join(config_path, "actions.json"))
+            keyboard_mapping = {}
+            for path in [user_config_path, config_path]:
+                config_file_path = os.path.join(path, "keyboard.config.json")
+                if self.exists(config_file_path):
+                    try:
+                        keyboard_mapping = self.load_json(config_file_path)
+                    except:
+                        print(f"Unable to open config file {config_file_path}")
+                        continue
+                    break
+            gamepad_mapping = {}
+            for config_file_path, _ in fingerprint:
+                if not os.path.basename(config_file_path).startswith("gamepad."):
+                    continue
+                try:
+                    gamepad_config = self.load_json(config_file_path)
+                    gamepad_mapping[gamepad_config["guid"]] = gamepad_config
+                except:
+                    print(f"Unable to open config file {config_file_path}")
+                    continue
+
+            # The single file store takes precedence over the files per mapping
+            consolidated = False
+            consolidated_file_path = os.path.join(user_config_path, self.CONSOLIDATED_FILE)
+            if self.exists(consolidated_file_path):
+                try:
+                    consolidated_config = self.load_json(consolidated_file_path)
+                    keyboard_mapping = consolidated_config.get("keyboard", keyboard_mapping)
+                    gamepad_mapping = dict(gamepad_mapping, **consolidated_config.get("gamepads", {}))
+                    consolidated = True
+                except:
+                    print(f"Unable to open config file {consolidated_file_path}")
+
+            snapshot = InputConfigSnapshot(fingerprint, actions, keyboard_mapping, gamepad_mapping, consolidated)
+            self.snapshots[key] = snapshot
+            return snapshot
+
+    def get_stats(self):
+        return {
+            "files": len(self.files),
+            "reads": self.reads,
+            "hits": self.hits,
+            "writes": self.writes,
+            "write_errors": self.write_errors,
+            "pending_writes": len(self.pending_writes),
+        }
+
+
+class ConfigWatcher(object):
+    """Calls the callback, from its own thread, when an input configuration file changed on disk"""
+
+    def __init__(self, config_path, user_config_path, callback, interval=1.0, store=None):
+        self.config_path = config_path
+        self.user_config_path = user_config_path
+        self.callback = callback
+        self.interval = interval
+        self.store = store if store is not None else ConfigStore.get_instance()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        fingerprint = self.store.get_fingerprint(self.config_path, self.user_config_path)
+        while not self.stop_event.wait(self.interval):
+            new_fingerprint = self.store.get_fingerprint(self.config_path, self.user_config_path)
+            if new_fingerprint != fingerprint:
+                fingerprint = new_fingerprint
+                try:
+                    self.callback()
+                except:
+                    print("Unable to reload the input configuration")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
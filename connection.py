@@ -0,0 +1,98 @@
+import aiohttp
+import asyncio
+import random
+import time
+
+from frame_metrics import RollingHistogram
+
+# Shared sessions, keyed by host and event loop since a session can only be used from its loop
+sessions = {}
+
+
+def get_session(host):
+    """Session shared by all the websockets to the host, created on first use"""
+    key = (host, asyncio.get_running_loop())
+    session = sessions.get(key)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit_per_host=4, keepalive_timeout=30))
+        sessions[key] = session
+    return session
+
+
+async def close_sessions():
+    """Close the sessions of the running loop"""
+    loop = asyncio.get_running_loop()
+    for key in [key for key in sessions if key[1] is loop]:
+        await sessions.pop(key).close()
+
+
+async def close_connections():
+    """Cancel the other tasks of the running loop, then close its sessions"""
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await close_sessions()
+
+
+def run_loop(loop):
+    """Run the loop until it is stopped, then close its connections and the loop itself"""
+    loop.run_forever()
+    loop.run_until_complete(close_connections())
+    loop.close()
+
+
+class Reconnector(object):
+    """Jittered exponential backoff between connection attempts, and reconnection time metrics"""
+
+    def __init__(self, initial_delay=0.02, max_delay=5.0, factor=2.0, stable_time=5.0):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        # Connections lasting less than that don't reset the backoff, so a flapping link isn't hammered
+        self.stable_time = stable_time
+        self.failures = 0
+        self.connected_ts = None
+        self.disconnected_ts = None
+
+        # Counters
+        self.attempts = 0
+        self.connections = 0
+        self.disconnections = 0
+        # Time from losing the connection to being connected again (milliseconds)
+        self.reconnect_time = RollingHistogram(size=100)
+
+    def next_delay(self):
+        """Time to wait before the next attempt, random up to an exponentially growing limit"""
+        self.attempts += 1
+        limit = min(self.initial_delay * self.factor ** self.failures, self.max_delay)
+        self.failures += 1
+        return random.uniform(limit / 2, limit)
+
+    def on_connected(self):
+        now = time.monotonic()
+        self.connections += 1
+        self.connected_ts = now
+        if self.disconnected_ts is not None:
+            self.reconnect_time.add(1000 * (now - self.disconnected_ts))
+            self.disconnected_ts = None
+
+    def on_disconnected(self):
+        now = time.monotonic()
+        if self.connected_ts is not None:
+            self.disconnections += 1
+            if now - self.connected_ts >= self.stable_time:
+                self.failures = 0
+            self.connected_ts = None
+        if self.disconnected_ts is None:
+            self.disconnected_ts = now
+
+    def get_stats(self):
+        stats = {
+            "attempts": self.attempts,
+            "connections": self.connections,
+            "disconnections": self.disconnections,
+            "backoff_failures": self.failures,
+        }
+        stats.update({f"reconnect_{key}_ms": value for key, value in self.reconnect_time.get_percentiles().items()})
+        return stats
@@ -0,0 +1,163 @@
+import asyncio
+import collections
+import json
+import threading
+import time
+import traceback
+
+from frame_metrics import RollingHistogram
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data):
+    """Parse a JSON message, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class TopicQueue(object):
+    """Messages of a topic waiting for their consumers, which run on a dedicated thread"""
+
+    # latest: only the newest message is kept, drop_oldest: oldest messages are dropped when full,
+    # lossless: the receive loop waits until there is room
+    POLICIES = ["latest", "drop_oldest", "lossless"]
+
+    def __init__(self, topic, policy="drop_oldest", max_size=64):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown drop policy {policy}")
+        self.topic = topic
+        self.policy = policy
+        self.max_size = 1 if policy == "latest" else max_size
+        self.items = collections.deque()
+        self.condition = threading.Condition()
+        self.consumers = []
+        self.thread = None
+
+        # Counters
+        self.received = 0
+        self.consumed = 0
+        self.dropped = 0
+        self.waits = 0
+        self.max_depth = 0
+        # Time between the message being received and its consumers being called (milliseconds)
+        self.lag = RollingHistogram(size=200)
+
+    def add_consumer(self, consumer):
+        self.consumers.append(consumer)
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name=f"topic_{self.topic}", daemon=True)
+            self.thread.start()
+
+    def put(self, message):
+        """Queue the message, returns False if it must be put again later (lossless policy)"""
+        with self.condition:
+            if len(self.items) >= self.max_size:
+                if self.policy == "lossless":
+                    return False
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append((time.monotonic(), message))
+            self.received += 1
+            self.max_depth = max(self.max_depth, len(self.items))
+            self.condition.notify()
+        return True
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.items:
+                    self.condition.wait()
+                received_ts, message = self.items.popleft()
+            self.lag.add(1000 * (time.monotonic() - received_ts))
+            for consumer in list(self.consumers):
+                try:
+                    consumer(message)
+                except:
+                    traceback.print_exc()
+            self.consumed += 1
+
+    def get_stats(self):
+        stats = {
+            "policy": self.policy,
+            "received": self.received,
+            "consumed": self.consumed,
+            "dropped": self.dropped,
+            "waits": self.waits,
+            "depth": len(self.items),
+            "max_depth": self.max_depth,
+        }
+        stats.update({f"lag_{key}_ms": value for key, value in self.lag.get_percentiles().items()})
+        return stats
+
+
+class MessageDispatcher(object):
+    """Routes the messages received to per topic queues, so a slow consumer doesn't stall the reception"""
+
+    DEFAULT_POLICIES = {
+        "status": ("latest", 1),
+        "configuration": ("lossless", 16),
+        "encoding": ("lossless", 4),
+        # High rate samples, the plots can do with a few missing
+        "telemetry": ("drop_oldest", 256),
+    }
+    # Time between two attempts to queue a message for a full lossless topic (seconds)
+    RETRY_DELAY = 0.005
+
+    def __init__(self, default_policy="drop_oldest", max_size=64):
+        self.default_policy = default_policy
+        self.max_size = max_size
+        self.policies = dict(self.DEFAULT_POLICIES)
+        self.queues = {}
+
+        # Counters
+        self.received = 0
+        self.unrouted = 0
+        self.errors = 0
+        self.parse_time = 0.0
+
+    def set_policy(self, topic, policy, max_size=None):
+        """Must be called before the first consumer of the topic is registered"""
+        self.policies[topic] = (policy, max_size if max_size is not None else self.max_size)
+
+    def register_consumer(self, topic, consumer):
+        if topic not in self.queues:
+            policy, max_size = self.policies.get(topic, (self.default_policy, self.max_size))
+            self.queues[topic] = TopicQueue(topic, policy=policy, max_size=max_size)
+        self.queues[topic].add_consumer(consumer)
+
+    async def dispatch(self, data):
+        """Called by the receive loop for each message, waits only when a lossless topic is full"""
+        self.received += 1
+        start = time.perf_counter()
+        try:
+            message = loads(data)
+            topic = message["topic"]
+        except:
+            self.errors += 1
+            print("Unable to parse message")
+            return
+        finally:
+            self.parse_time += time.perf_counter() - start
+
+        topic_queue = self.queues.get(topic)
+        if topic_queue is None:
+            self.unrouted += 1
+            return
+        while not topic_queue.put(message["message"]):
+            topic_queue.waits += 1
+            await asyncio.sleep(self.RETRY_DELAY)
+
+    def get_stats(self):
+        return {
+            "json_backend": "orjson" if orjson is not None else "json",
+            "received": self.received,
+            "unrouted": self.unrouted,
+            "errors": self.errors,
+            "parse_us": 1e6 * self.parse_time / self.received if self.received else 0.0,
+            "topics": {topic: topic_queue.get_stats() for topic, topic_queue in self.queues.items()},
+        }
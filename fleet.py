@@ -0,0 +1,245 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from pathlib import Path
+
+from PyQt5.QtWidgets import (
+    QAction,
+    QGridLayout,
+    QLabel,
+    QMainWindow,
+    QStatusBar,
+    QToolBar,
+    QWidget,
+)
+from PyQt5.QtGui import QIcon, QPixmap
+from PyQt5.QtCore import pyqtSignal, Qt
+
+from app import PlayMessagePopup
+from client import Client
+from connection import run_loop
+from frame_decoder import FrameDecoder
+from frame_pipeline import FramePipeline
+from gamepad import GamePad
+from video_stream import VideoStream
+
+
+class FrameBudget(object):
+    """Lets through at most max_fps frames per second, None for no limit"""
+
+    def __init__(self, max_fps=None):
+        self.max_fps = max_fps
+        self.next_frame_ts = 0.0
+
+    def allow(self):
+        if self.max_fps is None:
+            return True
+        now = time.monotonic()
+        if now < self.next_frame_ts:
+            return False
+        # Don't accumulate a backlog of allowed frames after a pause
+        self.next_frame_ts = max(self.next_frame_ts + 1.0 / self.max_fps, now)
+        return True
+
+
+class FleetRobot(object):
+    """Connection, video stream and decoding of one robot of the fleet"""
+
+    def __init__(self, app, index, host, frame_ready_callback, max_command_rate=20, video_window=4,
+                 decode_workers=1, grayscale=False):
+        self.index = index
+        self.host = host
+        self.name = host
+        self.client = Client(app=app, robot_config={}, max_command_rate=max_command_rate)
+        self.client.register_consumer("status", self.robot_init_callback)
+        self.frame_pipeline = FramePipeline(
+            # Called with the robot index when a new image is ready
+            frame_ready_callback=lambda: frame_ready_callback(index),
+            workers=decode_workers,
+            decoder=FrameDecoder(grayscale=grayscale)
+        )
+        self.budget = FrameBudget()
+        self.video_stream = VideoStream(
+            frame_callback=self.on_video_frame,
+            window=video_window,
+            decode_time=self.frame_pipeline.get_frame_time
+        )
+        # Frames received but not decoded because of the budget
+        self.decimated = 0
+
+    def robot_init_callback(self, message):
+        self.name = message["robot_name"]
+        self.client.input_config_manager.set_robot_config(message["config"])
+
+    def on_video_frame(self, data):
+        if self.budget.allow():
+            self.frame_pipeline.submit(data)
+        else:
+            self.decimated += 1
+
+    def start(self, loop):
+        loop.create_task(self.client.connect(self.host))
+        loop.create_task(self.video_stream.connect(self.host))
+
+    def get_status(self):
+        return f"{self.name}: {self.video_stream.fps} FPS"
+
+
+class RobotTile(QLabel):
+
+    def __init__(self, index, focus_callback):
+        super().__init__()
+        self.index = index
+        self.focus_callback = focus_callback
+        self.setAlignment(Qt.AlignCenter)
+        self.setMinimumSize(160, 120)
+        self.setPixmap(QPixmap(os.path.join(os.path.dirname(__file__), Path("pics/logo_small.svg"))))
+
+    def set_focused(self, focused):
+        self.setStyleSheet("border: 3px solid #2a82da;" if focused else "border: 3px solid transparent;")
+
+    def mousePressEvent(self, event):
+        self.focus_callback(self.index)
+
+
+class FleetWindow(QMainWindow):
+    """Tiled video of several robots, all connections sharing one event loop and one gamepad thread"""
+
+    frame_ready_signal = pyqtSignal(int)
+    replay_signal = pyqtSignal(str)
+
+    def __init__(self, hosts, max_command_rate=20, video_window=4, decode_workers=1, grayscale=False,
+                 gamepad_rate=100, background_fps=5):
+        super().__init__()
+        self.setWindowTitle("PiRobot Remote Control - Fleet")
+        self.setWindowIcon(QIcon(os.path.join(os.path.dirname(__file__), Path("pics/logo_small.svg"))))
+        self.resize(1280, 800)
+        self.popups = {}
+        self.gamepad_rate = gamepad_rate
+        # Frame rate of the tiles not focused
+        self.background_fps = background_fps
+        self.focused = 0
+        self.broadcast = False
+
+        self.robots = [
+            FleetRobot(self, index, host, frame_ready_callback=self.frame_ready_signal.emit,
+                       max_command_rate=max_command_rate, video_window=video_window,
+                       decode_workers=decode_workers, grayscale=grayscale)
+            for index, host in enumerate(hosts)
+        ]
+
+        # Video grid
+        grid = QWidget()
+        layout = QGridLayout()
+        columns = math.ceil(math.sqrt(len(self.robots)))
+        self.tiles = []
+        for robot in self.robots:
+            tile = RobotTile(robot.index, self.set_focus)
+            layout.addWidget(tile, robot.index // columns, robot.index % columns)
+            self.tiles.append(tile)
+        grid.setLayout(layout)
+        self.setCentralWidget(grid)
+        self.create_toolbar()
+        self.status_bar = QStatusBar()
+        self.setStatusBar(self.status_bar)
+
+        self.frame_ready_signal.connect(self.update_tile)
+        self.replay_signal.connect(lambda action: print("Instant replay is not available in fleet mode"))
+        self.set_focus(0)
+
+        # All the robots share the same event loop
+        self.loop = asyncio.new_event_loop()
+        for robot in self.robots:
+            robot.start(self.loop)
+        threading.Thread(target=run_loop, args=(self.loop,), daemon=True).start()
+        self.start_gamepad()
+
+    def create_toolbar(self):
+        toolbar = QToolBar("Toolbar")
+        self.addToolBar(toolbar)
+        self.broadcast_action = QAction("Broadcast", self)
+        self.broadcast_action.setCheckable(True)
+        self.broadcast_action.toggled.connect(self.set_broadcast)
+        toolbar.addAction(self.broadcast_action)
+        next_action = QAction("Next Robot", self)
+        next_action.triggered.connect(lambda: self.set_focus((self.focused + 1) % len(self.robots)))
+        toolbar.addAction(next_action)
+
+    def get_targets(self):
+        """Robots receiving the commands"""
+        return self.robots if self.broadcast else [self.robots[self.focused]]
+
+    def set_focus(self, index):
+        previous = self.robots[self.focused]
+        if index != self.focused and not self.broadcast:
+            # Don't leave the previous robot driving on the last command
+            previous.client.drive_robot(0, 0)
+        self.focused = index
+        for robot, tile in zip(self.robots, self.tiles):
+            robot.budget.max_fps = None if robot.index == index else self.background_fps
+            tile.set_focused(robot.index == index)
+        self.update_status_bar()
+
+    def set_broadcast(self, broadcast):
+        self.broadcast = broadcast
+        self.update_status_bar()
+
+    def update_status_bar(self):
+        mode = "Broadcast" if self.broadcast else f"Focused: {self.robots[self.focused].name}"
+        status = " | ".join(robot.get_status() for robot in self.robots)
+        self.status_bar.showMessage(f"{mode} | {status}")
+
+    def update_tile(self, index):
+        robot = self.robots[index]
+        tile = self.tiles[index]
+        qt_img = robot.frame_pipeline.get_latest_image()
+        if qt_img is None:
+            return
+        pixmap = QPixmap.fromImage(qt_img)
+        robot.frame_pipeline.release_image(qt_img)
+        tile.setPixmap(pixmap)
+        robot.frame_pipeline.frame_painted()
+        # Background tiles are decoded at a reduced scale when the stream is larger than the tile
+        robot.frame_pipeline.set_target_size(tile.size().width(), tile.size().height())
+        if index == self.focused:
+            self.update_status_bar()
+
+    def forward(self, callback_name):
+        def callback(*args):
+            for robot in self.get_targets():
+                getattr(robot.client, callback_name)(*args)
+        return callback
+
+    def start_gamepad(self):
+        callback = {
+            "axis_snapshot": self.forward("gamepad_axis_snapshot_callback"),
+            "button": self.forward("gamepad_button_callback"),
+            "hat_motion": self.forward("gamepad_hat_callback"),
+        }
+        GamePad.start_gamepad(callback=callback, active_rate=self.gamepad_rate)
+
+    def open_play_message_window(self, destination):
+        if "play_message" not in self.popups or not self.popups["play_message"].isVisible():
+            self.popups["play_message"] = PlayMessagePopup(
+                callback=self.forward("play_message"), destination=destination
+            )
+            self.popups["play_message"].show()
+
+    def closeEvent(self, event):
+        for popup in self.popups.values():
+            if popup.isVisible():
+                popup.close()
+        GamePad.stop_gamepad()
+        for robot in self.robots:
+            robot.frame_pipeline.shutdown()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def keyPressEvent(self, e):
+        if not e.isAutoRepeat():
+            self.forward("key_press_callback")(e, True)
+
+    def keyReleaseEvent(self, e):
+        if not e.isAutoRepeat():
+            self.forward("key_press_callback")(e, False)
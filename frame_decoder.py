@@ -0,0 +1,75 @@
+import cv2
+import numpy as np
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJPF_GRAY, TJFLAG_FASTDCT
+except ImportError:
+    TurboJPEG = None
+
+
+class FrameDecoder(object):
+    """JPEG decoder skipping the resolution that would be thrown away when displaying the frame"""
+
+    SCALES = [8, 4, 2, 1]
+    COLOR_FLAGS = {
+        1: cv2.IMREAD_COLOR,
+        2: cv2.IMREAD_REDUCED_COLOR_2,
+        4: cv2.IMREAD_REDUCED_COLOR_4,
+        8: cv2.IMREAD_REDUCED_COLOR_8,
+    }
+    GRAYSCALE_FLAGS = {
+        1: cv2.IMREAD_GRAYSCALE,
+        2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+        4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+        8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+    }
+
+    def __init__(self, grayscale=False, reduced=True, use_turbojpeg=True):
+        self.grayscale = grayscale
+        # Decode at a reduced scale when the display is smaller than the stream
+        self.reduced = reduced
+        self.turbojpeg = None
+        if use_turbojpeg and TurboJPEG is not None:
+            try:
+                self.turbojpeg = TurboJPEG()
+            except Exception:
+                # Python bindings installed without the libturbojpeg library
+                print("Unable to load libturbojpeg, using OpenCV to decode frames")
+        # Full resolution of the stream, learnt from the decoded frames
+        self.source_size = None
+        self.scale = 1
+
+    @property
+    def backend(self):
+        return "turbojpeg" if self.turbojpeg is not None else "opencv"
+
+    def get_scale(self, target_width, target_height):
+        if not self.reduced or self.source_size is None:
+            return 1
+        source_width, source_height = self.source_size
+        for scale in self.SCALES:
+            if source_width // scale >= target_width and source_height // scale >= target_height:
+                return scale
+        return 1
+
+    def decode(self, data, target_width, target_height):
+        """Decode a JPEG frame to a BGR (or grayscale) image at least as large as the target size"""
+        scale = self.get_scale(target_width, target_height)
+        if self.turbojpeg is not None:
+            frame = self.turbojpeg.decode(
+                data,
+                pixel_format=TJPF_GRAY if self.grayscale else TJPF_BGR,
+                scaling_factor=(1, scale),
+                flags=TJFLAG_FASTDCT,
+            )
+        else:
+            flags = self.GRAYSCALE_FLAGS[scale] if self.grayscale else self.COLOR_FLAGS[scale]
+            frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+        if frame is None:
+            raise ValueError("Unable to decode frame")
+        if frame.ndim == 3 and frame.shape[2] == 1:
+            frame = frame[:, :, 0]
+
+        self.scale = scale
+        self.source_size = (frame.shape[1] * scale, frame.shape[0] * scale)
+        return frame
@@ -0,0 +1,113 @@
+import collections
+import json
+import struct
+import threading
+import time
+
+# JPEG comment segment, optionally added by the server right after the SOI marker
+FRAME_HEADER_MARKER = b"\xff\xd8\xff\xfe"
+FRAME_HEADER_TAG = b"pirobot"
+FRAME_HEADER_FORMAT = "!7sQd"
+FRAME_HEADER_SIZE = struct.calcsize(FRAME_HEADER_FORMAT)
+
+
+def build_frame_header(seq, sent_ts):
+    """JPEG comment segment carrying the server frame sequence number and send timestamp"""
+    payload = struct.pack(FRAME_HEADER_FORMAT, FRAME_HEADER_TAG, seq, sent_ts)
+    return b"\xff\xfe" + struct.pack("!H", len(payload) + 2) + payload
+
+
+def parse_frame_header(data):
+    """Return the server sequence number and send timestamp embedded in the frame, if any"""
+    if data[:4] == FRAME_HEADER_MARKER and data[6:13] == FRAME_HEADER_TAG:
+        _, seq, sent_ts = struct.unpack_from(FRAME_HEADER_FORMAT, data, 6)
+        return seq, sent_ts
+    return None, None
+
+
+class FrameStamps(object):
+    __slots__ = ["seq", "server_seq", "sent", "received", "decoded", "converted", "painted"]
+
+    def __init__(self, seq, data):
+        self.seq = seq
+        self.server_seq, self.sent = parse_frame_header(data)
+        self.received = time.monotonic()
+        self.decoded = None
+        self.converted = None
+        self.painted = None
+
+
+class RollingHistogram(object):
+    """Keeps the last samples to compute percentiles"""
+
+    def __init__(self, size=600):
+        self.samples = collections.deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, value):
+        with self.lock:
+            self.samples.append(value)
+
+    def get_percentiles(self, percentiles=(50, 95, 99)):
+        with self.lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return {f"p{p}": None for p in percentiles}
+        return {f"p{p}": samples[min(len(samples) - 1, len(samples) * p // 100)] for p in percentiles}
+
+
+class FrameMetrics(object):
+    """Per stage latency of the frames painted, in milliseconds"""
+
+    STAGES = ["decode", "convert", "paint", "total", "glass_to_glass"]
+
+    def __init__(self, size=600):
+        self.histograms = {stage: RollingHistogram(size) for stage in self.STAGES}
+        self.painted = 0
+        self.skipped = 0
+        self.server_skipped = 0
+        self.last_seq = None
+        self.last_server_seq = None
+
+    def on_painted(self, stamps):
+        stamps.painted = time.monotonic()
+        self.histograms["decode"].add(1000 * (stamps.decoded - stamps.received))
+        self.histograms["convert"].add(1000 * (stamps.converted - stamps.decoded))
+        self.histograms["paint"].add(1000 * (stamps.painted - stamps.converted))
+        self.histograms["total"].add(1000 * (stamps.painted - stamps.received))
+        if stamps.sent is not None:
+            # Only meaningful when the server clock is synchronized, e.g. a local stand-in server
+            self.histograms["glass_to_glass"].add(1000 * (time.time() - stamps.sent))
+
+        # Gaps in the sequence numbers are frames received but never painted
+        self.painted += 1
+        if self.last_seq is not None and stamps.seq > self.last_seq + 1:
+            self.skipped += stamps.seq - self.last_seq - 1
+        self.last_seq = stamps.seq
+        if stamps.server_seq is not None:
+            if self.last_server_seq is not None and stamps.server_seq > self.last_server_seq + 1:
+                self.server_skipped += stamps.server_seq - self.last_server_seq - 1
+            self.last_server_seq = stamps.server_seq
+
+    def get_summary(self):
+        summary = {stage: histogram.get_percentiles() for stage, histogram in self.histograms.items()}
+        summary.update({
+            "painted": self.painted,
+            "skipped": self.skipped,
+            "server_skipped": self.server_skipped,
+        })
+        return summary
+
+    def get_status(self):
+        total = self.histograms["total"].get_percentiles()
+        if total["p50"] is None:
+            return ""
+        status = f"Latency p50/p95/p99: {total['p50']:.0f}/{total['p95']:.0f}/{total['p99']:.0f} ms"
+        glass_to_glass = self.histograms["glass_to_glass"].get_percentiles()
+        if glass_to_glass["p50"] is not None:
+            status += f" (glass to glass p50: {glass_to_glass['p50']:.0f} ms)"
+        return status + f" | Skipped: {self.skipped}"
+
+    def export(self, file_path):
+        with open(file_path, "w") as metrics_file:
+            json.dump(self.get_summary(), metrics_file, indent=2)
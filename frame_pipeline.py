@@ -0,0 +1,242 @@
+import cv2
+import numpy as np
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5 import QtGui
+
+from frame_decoder import FrameDecoder
+from frame_metrics import FrameMetrics, FrameStamps
+
+
+class BufferPool(object):
+    """Preallocated image buffers, keyed by shape and reused between frames"""
+
+    def __init__(self, max_free=4):
+        self.max_free = max_free
+        self.free = {}
+        self.current_key = None
+        self.lock = threading.Lock()
+        self.allocated = 0
+
+    def acquire(self, shape, dtype):
+        key = (shape, np.dtype(dtype).str)
+        with self.lock:
+            if key != self.current_key:
+                # Display size changed, buffers of the previous size are no longer needed
+                self.free = {}
+                self.current_key = key
+            buffers = self.free.get(key)
+            if buffers:
+                return buffers.pop()
+            self.allocated += 1
+        return np.empty(shape, dtype=dtype)
+
+    def release(self, buffer):
+        key = (buffer.shape, buffer.dtype.str)
+        with self.lock:
+            if key == self.current_key:
+                buffers = self.free.setdefault(key, [])
+                if len(buffers) < self.max_free:
+                    buffers.append(buffer)
+
+
+class FrameConverter(object):
+    """Convert opencv images to QImages in a single resize, into pooled buffers"""
+
+    # Qt >= 5.14 can display BGR images without color conversion
+    BGR_FORMAT = getattr(QtGui.QImage, "Format_BGR888", None)
+
+    def __init__(self):
+        self.pool = BufferPool()
+        self.lock = threading.Lock()
+        # Buffers backing the QImages handed out, until they are released
+        self.leases = {}
+
+    @staticmethod
+    def get_fitted_size(width, height, target_width, target_height):
+        """Largest size fitting in the target size, keeping the aspect ratio"""
+        scale = min(target_width / width, target_height / height)
+        return max(int(round(width * scale)), 1), max(int(round(height * scale)), 1)
+
+    def convert_cv_qt(self, cv_img, width, height):
+        """Convert from an opencv image to a QImage fitting in width x height, call release() once painted"""
+        h, w = cv_img.shape[:2]
+        fitted_width, fitted_height = self.get_fitted_size(w, h, width, height)
+        if (fitted_width, fitted_height) == (w, h) and cv_img.flags.c_contiguous:
+            # Decoded frame already has the right size
+            buffer, pooled = cv_img, False
+        else:
+            buffer, pooled = self.pool.acquire((fitted_height, fitted_width) + cv_img.shape[2:], cv_img.dtype), True
+            interpolation = cv2.INTER_AREA if fitted_width < w else cv2.INTER_LINEAR
+            cv2.resize(cv_img, (fitted_width, fitted_height), dst=buffer, interpolation=interpolation)
+
+        if buffer.ndim == 2:
+            image_format = QtGui.QImage.Format_Grayscale8
+        elif self.BGR_FORMAT is not None:
+            image_format = self.BGR_FORMAT
+        else:
+            cv2.cvtColor(buffer, cv2.COLOR_BGR2RGB, dst=buffer)
+            image_format = QtGui.QImage.Format_RGB888
+        image = QtGui.QImage(buffer.data, fitted_width, fitted_height, buffer.strides[0], image_format)
+        with self.lock:
+            self.leases[id(image)] = (buffer, pooled)
+        return image
+
+    def release(self, image):
+        """The image is no longer used, its buffer can be reused"""
+        with self.lock:
+            buffer, pooled = self.leases.pop(id(image), (None, False))
+        if pooled:
+            self.pool.release(buffer)
+
+
+class StageTimer(object):
+    ALPHA = 0.1
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.average = 0.0
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        if self.count == 1:
+            self.average = duration
+        else:
+            self.average += self.ALPHA * (duration - self.average)
+
+    def get_stats(self):
+        return {
+            "count": self.count,
+            "avg_ms": 1000 * self.average,
+            "mean_ms": 1000 * self.total / self.count if self.count else 0.0,
+            "max_ms": 1000 * self.max,
+        }
+
+
+class FramePipeline(object):
+    """Decode and convert frames on a thread pool, deliver the latest ready-to-paint QImage in order"""
+
+    STAGES = ["queue", "decode", "convert"]
+
+    def __init__(self, frame_ready_callback, workers=2, decoder=None):
+        # Called from a worker thread when a new image is ready, see get_latest_image()
+        self.frame_ready_callback = frame_ready_callback
+        self.workers = workers
+        self.decoder = decoder if decoder is not None else FrameDecoder()
+        self.converter = FrameConverter()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="frame_pipeline")
+        self.lock = threading.Lock()
+        self.target_size = (640, 480)
+        self.next_seq = 0
+        self.last_delivered_seq = -1
+        self.latest_image = None
+        self.latest_stamps = None
+        self.painting_stamps = None
+        self.paint_pending = False
+        self.metrics = FrameMetrics()
+
+        # Counters
+        self.timers = {stage: StageTimer() for stage in self.STAGES}
+        self.submitted = 0
+        self.dropped_stale = 0
+        self.dropped_out_of_order = 0
+        self.dropped_paint = 0
+        self.errors = 0
+
+    def set_target_size(self, width, height):
+        self.target_size = (max(width, 1), max(height, 1))
+
+    def submit(self, data):
+        """Queue an encoded frame, never blocks the caller"""
+        with self.lock:
+            seq = self.next_seq
+            self.next_seq += 1
+            self.submitted += 1
+        self.executor.submit(self.process, seq, data, FrameStamps(seq, data))
+
+    def process(self, seq, data, stamps):
+        start = time.monotonic()
+        self.timers["queue"].add(start - stamps.received)
+        # Frames waiting behind a full set of newer frames are already stale
+        if self.next_seq - seq > self.workers:
+            with self.lock:
+                self.dropped_stale += 1
+            return
+        try:
+            width, height = self.target_size
+            frame = self.decoder.decode(data, width, height)
+            stamps.decoded = time.monotonic()
+            self.timers["decode"].add(stamps.decoded - start)
+            image = self.converter.convert_cv_qt(frame, width, height)
+            stamps.converted = time.monotonic()
+            self.timers["convert"].add(stamps.converted - stamps.decoded)
+        except Exception:
+            with self.lock:
+                self.errors += 1
+            print("Unable to decode frame")
+            return
+
+        with self.lock:
+            if seq < self.last_delivered_seq:
+                # A newer frame has already been delivered
+                self.dropped_out_of_order += 1
+                self.converter.release(image)
+                return
+            self.last_delivered_seq = seq
+            if self.latest_image is not None:
+                # The previous image was never painted
+                self.dropped_paint += 1
+                self.converter.release(self.latest_image)
+            self.latest_image = image
+            self.latest_stamps = stamps
+            notify = not self.paint_pending
+            self.paint_pending = True
+        if notify:
+            self.frame_ready_callback()
+
+    def get_latest_image(self):
+        """Called by the GUI thread, returns the newest image not painted yet, see release_image()"""
+        with self.lock:
+            image = self.latest_image
+            self.painting_stamps = self.latest_stamps
+            self.latest_image = None
+            self.latest_stamps = None
+            self.paint_pending = False
+        return image
+
+    def release_image(self, image):
+        self.converter.release(image)
+
+    def frame_painted(self):
+        """Called by the GUI thread once the image returned by get_latest_image() is displayed"""
+        if self.painting_stamps is not None:
+            self.metrics.on_painted(self.painting_stamps)
+            self.painting_stamps = None
+
+    def get_frame_time(self):
+        """Average processing time per frame, given all workers are busy"""
+        return (self.timers["decode"].average + self.timers["convert"].average) / self.workers
+
+    def get_stats(self):
+        stats = {stage: timer.get_stats() for stage, timer in self.timers.items()}
+        stats.update({
+            "workers": self.workers,
+            "decoder": self.decoder.backend,
+            "decode_scale": self.decoder.scale,
+            "buffers_allocated": self.converter.pool.allocated,
+            "submitted": self.submitted,
+            "dropped_stale": self.dropped_stale,
+            "dropped_out_of_order": self.dropped_out_of_order,
+            "dropped_paint": self.dropped_paint,
+            "errors": self.errors,
+        })
+        return stats
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -1,6 +1,9 @@
+import array
+import collections
 import logging
 import pygame
 import threading
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -8,72 +11,197 @@ logger = logging.getLogger(__name__)
 class GamePad():
     running = False
     thread = None
+    joysticks = {}
+    # Value of each axis when released, by joystick instance id: triggers rest at -1 or 1 on some gamepads
+    axis_rest = {}
+    # The loop checks if it must stop at least this often (seconds)
+    IDLE_TIMEOUT = 0.25
+    # Axis value above which a stick is considered deflected
+    DEFLECTION_THRESHOLD = 0.05
+    EVENT_TYPES = [
+        pygame.JOYBUTTONDOWN,
+        pygame.JOYBUTTONUP,
+        pygame.JOYAXISMOTION,
+        pygame.JOYHATMOTION,
+        pygame.JOYDEVICEADDED,
+        pygame.JOYDEVICEREMOVED,
+        pygame.USEREVENT,
+    ]
+
+    # Counters
+    stats = collections.Counter()
+    # Time between the loop waking up and each callback being called (seconds)
+    latency = collections.deque(maxlen=1000)
 
     @staticmethod
-    def start_loop(callback):
-        joysticks = {}
-        clock = pygame.time.Clock()
+    def start_loop(callback, active_rate=100):
+        """Wait for joystick events, axes are also polled at active_rate Hz while a stick is deflected"""
+        GamePad.joysticks = {}
+        GamePad.axis_rest = {}
+        axis_values = {}
 
         GamePad.running = True
         while GamePad.running:
             try:
                 if not pygame.get_init():
                     pygame.init()
-                for event in pygame.event.get():
-                    # Buttons
-                    if event.type in [pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP]:
-                        joystick = joysticks[event.instance_id]
-                        if "button" in callback:
-                            callback["button"](joystick, event.button, event.type == pygame.JOYBUTTONDOWN)
-                    # AXIS
-                    if event.type == pygame.JOYAXISMOTION:
-                        joystick = joysticks[event.instance_id]
-                        if "axis_motion" in callback:
-                            callback["axis_motion"](joystick, event.axis)
-                    # HAT
-                    if event.type == pygame.JOYHATMOTION:
-                        joystick = joysticks[event.instance_id]
-                        if "hat_motion" in callback:
-                            callback["hat_motion"](joystick, event.hat, event.value[0], event.value[1])
-
-                    # Joystick Added
-                    if event.type == pygame.JOYDEVICEADDED:
-                        joy = pygame.joystick.Joystick(event.device_index)
-                        joysticks[joy.get_instance_id()] = joy
-                        print(f"Joystick {joy.get_name()} ({joy.get_guid()}) connected")
-                        if "joystick_added" in callback:
-                            callback["joystick_added"](joy)
-
-                    # Joystick Remove
-                    if event.type == pygame.JOYDEVICEREMOVED:
-                        print(f"Joystick {joy.get_name()} ({joy.get_guid()}) disconnected")
-                        if "joystick_removed" in callback:
-                            callback["joystick_removed"](joysticks[event.instance_id])
-                        del joysticks[event.instance_id]
+                    # Only wake up for joystick events
+                    pygame.event.set_blocked(None)
+                    pygame.event.set_allowed(GamePad.EVENT_TYPES)
+                    # The device added events queued by init can be discarded by the filter
+                    for device_index in range(pygame.joystick.get_count()):
+                        GamePad.add_joystick(device_index, callback, axis_values)
 
+                deflected = any(
+                    abs(value - rest) > GamePad.DEFLECTION_THRESHOLD
+                    for instance_id, values in axis_values.items()
+                    for value, rest in zip(values, GamePad.axis_rest.get(instance_id, ()))
+                )
+                timeout = 1.0 / active_rate if deflected and active_rate else GamePad.IDLE_TIMEOUT
+                event = pygame.event.wait(int(1000 * timeout))
+                wake_ts = time.perf_counter()
+                # Axis and hat changes of the tick, sent once all the pending events are processed
+                changes = dict(axes={}, hats={})
+                if event.type == pygame.NOEVENT:
+                    if deflected:
+                        GamePad.poll_axes(axis_values, changes)
+                else:
+                    for event in [event] + pygame.event.get():
+                        GamePad.process_event(event, callback, axis_values, changes, wake_ts)
+                GamePad.flush_changes(callback, axis_values, changes, wake_ts)
             except KeyboardInterrupt:
                 raise
             except:
                 logger.error("Unable to process gamepad event", exc_info=True)
                 continue
-            finally:
-                # Limit CPU used by the loop
-                fps = 30
-                clock.tick(fps)
         pygame.quit()
         print("Stopping gamepad loop")
 
     @staticmethod
-    def start_gamepad(callback):
+    def process_event(event, callback, axis_values, changes, wake_ts):
+        GamePad.stats["events"] += 1
+        # Buttons
+        if event.type in [pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP]:
+            joystick = GamePad.joysticks[event.instance_id]
+            if "button" in callback:
+                GamePad.run_callback(wake_ts, callback["button"], joystick, event.button,
+                                     event.type == pygame.JOYBUTTONDOWN)
+        # AXIS
+        if event.type == pygame.JOYAXISMOTION:
+            GamePad.stats["axis_events"] += 1
+            values = axis_values.get(event.instance_id)
+            if values is not None and event.axis < len(values):
+                values[event.axis] = event.value
+            changes["axes"].setdefault(event.instance_id, set()).add(event.axis)
+        # HAT
+        if event.type == pygame.JOYHATMOTION:
+            GamePad.stats["hat_events"] += 1
+            changes["hats"][(event.instance_id, event.hat)] = event.value
+
+        # Joystick Added
+        if event.type == pygame.JOYDEVICEADDED:
+            GamePad.add_joystick(event.device_index, callback, axis_values)
+
+        # Joystick Remove
+        if event.type == pygame.JOYDEVICEREMOVED:
+            joy = GamePad.joysticks[event.instance_id]
+            print(f"Joystick {joy.get_name()} ({joy.get_guid()}) disconnected")
+            if "joystick_removed" in callback:
+                callback["joystick_removed"](joy)
+            del GamePad.joysticks[event.instance_id]
+            GamePad.axis_rest.pop(event.instance_id, None)
+            axis_values.pop(event.instance_id, None)
+            # Motion of the removed joystick earlier in the tick
+            changes["axes"].pop(event.instance_id, None)
+            for key in [key for key in changes["hats"] if key[0] == event.instance_id]:
+                del changes["hats"][key]
+
+    @staticmethod
+    def add_joystick(device_index, callback, axis_values):
+        joy = pygame.joystick.Joystick(device_index)
+        instance_id = joy.get_instance_id()
+        if instance_id in GamePad.joysticks:
+            # Already registered when the loop started
+            return
+        GamePad.joysticks[instance_id] = joy
+        # Current positions, e.g. triggers resting at -1 or a stick held when connected
+        values = array.array("d", [joy.get_axis(i) for i in range(joy.get_numaxes())])
+        axis_values[instance_id] = values
+        # Axes read at an end when connected are triggers, the sticks rest at the center
+        GamePad.axis_rest[instance_id] = array.array("d", [value if abs(value) > 0.9 else 0.0 for value in values])
+        print(f"Joystick {joy.get_name()} ({joy.get_guid()}) connected")
+        if "joystick_added" in callback:
+            callback["joystick_added"](joy)
+
+    @staticmethod
+    def poll_axes(axis_values, changes):
+        """Read the deflected sticks, in case the device reports motion without events"""
+        GamePad.stats["polls"] += 1
+        pygame.event.pump()
+        for instance_id, values in axis_values.items():
+            joystick = GamePad.joysticks.get(instance_id)
+            if joystick is None:
+                continue
+            for axis, value in enumerate(values):
+                new_value = joystick.get_axis(axis)
+                if new_value != value:
+                    values[axis] = new_value
+                    changes["axes"].setdefault(instance_id, set()).add(axis)
+
+    @staticmethod
+    def flush_changes(callback, axis_values, changes, wake_ts):
+        """One callback per joystick with the snapshot of all its axes, one per hat with its last value"""
+        for instance_id, changed_axes in changes["axes"].items():
+            joystick = GamePad.joysticks.get(instance_id)
+            if joystick is None:
+                continue
+            if "axis_snapshot" in callback:
+                values = axis_values.get(instance_id)
+                if values is None:
+                    # Unknown number of axes, e.g. device added before the loop started
+                    values = array.array("d", [joystick.get_axis(axis) for axis in range(max(changed_axes) + 1)])
+                GamePad.run_callback(wake_ts, callback["axis_snapshot"], joystick, values, changed_axes)
+            elif "axis_motion" in callback:
+                for axis in sorted(changed_axes):
+                    GamePad.run_callback(wake_ts, callback["axis_motion"], joystick, axis)
+        for (instance_id, hat), value in changes["hats"].items():
+            joystick = GamePad.joysticks.get(instance_id)
+            if joystick is not None and "hat_motion" in callback:
+                GamePad.run_callback(wake_ts, callback["hat_motion"], joystick, hat, value[0], value[1])
+
+    @staticmethod
+    def run_callback(wake_ts, callback, *args):
+        GamePad.stats["callbacks"] += 1
+        GamePad.latency.append(time.perf_counter() - wake_ts)
+        callback(*args)
+
+    @staticmethod
+    def get_stats():
+        latency = sorted(GamePad.latency)
+        stats = dict(GamePad.stats)
+        if latency:
+            stats["latency_p50_ms"] = 1000 * latency[len(latency) // 2]
+            stats["latency_max_ms"] = 1000 * latency[-1]
+        return stats
+
+    @staticmethod
+    def start_gamepad(callback, active_rate=100):
         if GamePad.thread is not None:
             GamePad.stop_gamepad()
-        GamePad.thread = threading.Thread(target=GamePad.start_loop, kwargs=dict(callback=callback), daemon=True)
+        GamePad.thread = threading.Thread(
+            target=GamePad.start_loop, kwargs=dict(callback=callback, active_rate=active_rate), daemon=True
+        )
         GamePad.thread.start()
 
     @staticmethod
     def stop_gamepad():
         if GamePad.thread is not None:
             GamePad.running = False
+            try:
+                # Wake up the loop waiting for events
+                if pygame.get_init():
+                    pygame.event.post(pygame.event.Event(pygame.USEREVENT))
+            except pygame.error:
+                pass
             GamePad.thread.join()
             GamePad.thread = None
-
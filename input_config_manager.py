@@ -1,4 +1,4 @@
-import json
+import copy
 import os
 from functools import partial
 from pathlib import Path
@@ -21,7 +21,8 @@ from PyQt5.QtWidgets import (
     QWidget,
 )
 
-from gamepad import GamePad
+from axis_filter import AxisCalibration, StickFilter
+from config_store import ConfigStore
 
 
 def snake_case_to_human(text):
@@ -54,9 +55,121 @@ class InputConfigManager(object):
         self.actions = {}
         self.keyboard_mapping = {}
         self.gamepad_mapping = {}
+        # Files the mappings were loaded from, and the mappings changed since: "keyboard" or gamepad guids
+        self.snapshot = None
+        self.dirty = set()
+        # Save all the mappings to a single file
+        self.consolidated = False
+
+        # Reverse indexes, rebuilt by load() and the set/reset methods
+        self.capabilities = {}
+        self.axis_group_to_group = {}
+        self.hat_group_to_group = {}
+        self.group_axis_groups = {}
+        self.keyboard_index = {}
+        self.gamepad_index = {}
 
         self.load()
 
+    @staticmethod
+    def get_event_key(event):
+        return tuple(sorted(event.items()))
+
+    def build_indexes(self):
+        # Each index is built aside and assigned once complete, the gamepad and dispatcher threads read them
+        self.index_actions()
+        self.index_keyboard()
+        self.gamepad_index = {guid: self.get_gamepad_index(guid) for guid in self.gamepad_mapping.keys()}
+
+    def index_actions(self):
+        capabilities = {}
+        axis_group_to_group = {}
+        hat_group_to_group = {}
+        group_axis_groups = {}
+        for action, action_config in self.actions.items():
+            needs = action_config.get("needs")
+            capabilities[action] = needs is None or self.robot_config.get(f"robot_has_{needs}", False)
+            group = action_config.get("group")
+            axis_group = action_config.get("axis_group")
+            hat_group = action_config.get("hat_group")
+            if axis_group is not None and axis_group not in axis_group_to_group:
+                axis_group_to_group[axis_group] = group
+            if hat_group is not None and hat_group not in hat_group_to_group:
+                hat_group_to_group[hat_group] = group
+            axis_name = action_config.get("axis_name")
+            if group is not None and axis_name is not None and axis_group is not None:
+                group_axis_groups.setdefault(group, []).append((axis_name, axis_group))
+        self.capabilities = capabilities
+        self.axis_group_to_group = axis_group_to_group
+        self.hat_group_to_group = hat_group_to_group
+        self.group_axis_groups = group_axis_groups
+
+    def index_keyboard(self):
+        keyboard_index = {}
+        for action, event in self.keyboard_mapping.items():
+            keyboard_index.setdefault(self.get_event_key(event), action)
+        self.keyboard_index = keyboard_index
+
+    def index_gamepad(self, guid):
+        if guid not in self.gamepad_mapping:
+            self.gamepad_index.pop(guid, None)
+            return
+        self.gamepad_index[guid] = self.get_gamepad_index(guid)
+
+    def get_gamepad_index(self, guid):
+        gamepad_config = self.gamepad_mapping[guid]
+        index = dict(actions={}, axis_group={}, hat_group={}, axis_to_group={}, hat_to_group={}, group_axes={})
+        for action, event in gamepad_config["actions"].items():
+            index["actions"].setdefault(self.get_event_key(event), action)
+        for axis_group, event in gamepad_config["axis_group"].items():
+            index["axis_group"].setdefault(self.get_event_key(event), axis_group)
+            if "axis" in event:
+                index["axis_to_group"][event["axis"]] = self.axis_group_to_group.get(axis_group)
+        for hat_group, event in gamepad_config["hat_group"].items():
+            index["hat_group"].setdefault(self.get_event_key(event), hat_group)
+            if "hat" in event:
+                index["hat_to_group"][event["hat"]] = self.hat_group_to_group.get(hat_group)
+        for group, axis_groups in self.group_axis_groups.items():
+            group_axes = []
+            for axis_name, axis_group in axis_groups:
+                if axis_name not in [name for name, _ in group_axes]:
+                    axis = gamepad_config["axis_group"].get(axis_group, {}).get("axis")
+                    if axis is not None:
+                        group_axes.append((axis_name, axis))
+            index["group_axes"][group] = group_axes
+        # Signal processing of the axes, stored with the gamepad mapping
+        index["calibration"] = {
+            int(axis): AxisCalibration(**calibration)
+            for axis, calibration in gamepad_config.get("calibration", {}).items()
+        }
+        # Only the groups with a filter in the gamepad mapping are filtered, with "enabled" to turn it off
+        index["filters"] = {}
+        for group in index["group_axes"].keys():
+            filter_config = gamepad_config.get("filters", {}).get(group)
+            if filter_config is not None and filter_config.get("enabled", True):
+                index["filters"][group] = StickFilter.from_config(filter_config)
+        return index
+
+    def set_axis_calibration(self, joystick, axis, center, minimum, maximum):
+        guid = joystick.get_guid()
+        if guid in self.gamepad_mapping:
+            self.gamepad_mapping[guid].setdefault("calibration", {})[str(axis)] = dict(
+                center=center, minimum=minimum, maximum=maximum
+            )
+            self.dirty.add(guid)
+            self.index_gamepad(guid)
+
+    def set_filter_for_group(self, joystick, group, **filter_config):
+        guid = joystick.get_guid()
+        if guid in self.gamepad_mapping:
+            self.gamepad_mapping[guid].setdefault("filters", {})[group] = filter_config
+            self.dirty.add(guid)
+            self.index_gamepad(guid)
+
+    def set_robot_config(self, robot_config):
+        self.robot_config = robot_config
+        self.index_actions()
+
     def is_configured(self, joystick):
         return joystick.get_guid() in self.gamepad_mapping
 
@@ -73,10 +186,7 @@ class InputConfigManager(object):
             return None
 
     def get_action_for_keyboard_event(self, event):
-        for action, action_event in self.keyboard_mapping.items():
-            if action_event == event:
-                return action
-        return None
+        return self.keyboard_index.get(self.get_event_key(event))
 
     def get_axis_group_for_keyboard_key(self, key):
         return self.get_action_for_keyboard_event({"type": "key", "key": key})
@@ -129,80 +239,70 @@ class InputConfigManager(object):
         existing_action = self.get_action_for_keyboard_event(event)
         if existing_action is not None:
             del self.keyboard_mapping[existing_action]
+        self.reset_keyboard_event_for_action(action)
         self.keyboard_mapping[action] = event
+        self.keyboard_index[self.get_event_key(event)] = action
+        self.dirty.add("keyboard")
 
     def reset_keyboard_event_for_action(self, action):
         if action in self.keyboard_mapping:
-            del self.keyboard_mapping[action]
+            event_key = self.get_event_key(self.keyboard_mapping.pop(action))
+            if self.keyboard_index.get(event_key) == action:
+                del self.keyboard_index[event_key]
+            self.dirty.add("keyboard")
 
     def get_action_for_gamepad_event(self, joystick, event):
-        guid = joystick.get_guid()
-        if guid in self.gamepad_mapping:
-            for action, action_event in self.gamepad_mapping[guid]["actions"].items():
-                if action_event == event:
-                    return action
+        index = self.gamepad_index.get(joystick.get_guid())
+        if index is not None:
+            return index["actions"].get(self.get_event_key(event))
         return None
 
     def get_action_for_gamepad_button(self, joystick, button):
         return self.get_action_for_gamepad_event(joystick, {"type": "button", "button": button})
 
     def get_axis_group_for_gamepad_event(self, joystick, event):
-        guid = joystick.get_guid()
-        if guid in self.gamepad_mapping:
-            for axis_group, axis_group_event in self.gamepad_mapping[guid]["axis_group"].items():
-                if axis_group_event == event:
-                    return axis_group
+        index = self.gamepad_index.get(joystick.get_guid())
+        if index is not None:
+            return index["axis_group"].get(self.get_event_key(event))
         return None
 
     def get_hat_group_for_gamepad_event(self, joystick, event):
-        guid = joystick.get_guid()
-        if guid in self.gamepad_mapping:
-            for hat_group, hat_group_event in self.gamepad_mapping[guid]["hat_group"].items():
-                if hat_group_event == event:
-                    return hat_group
+        index = self.gamepad_index.get(joystick.get_guid())
+        if index is not None:
+            return index["hat_group"].get(self.get_event_key(event))
         return None
 
-    def get_axis_position_for_group(self, joystick, group):
-        guid = joystick.get_guid()
+    def get_axis_position_for_group(self, joystick, group, axis_values=None):
+        index = self.gamepad_index.get(joystick.get_guid())
+        if index is None:
+            return {}
         position = {}
-        if guid in self.gamepad_mapping:
-            for action_config in self.actions.values():
-                if group is not None and action_config.get("group") == group:
-                    axis_name = action_config.get("axis_name")
-                    axis_group = action_config.get("axis_group")
-                    if axis_name is not None and axis_group is not None and axis_name not in position:
-                        axis = self.gamepad_mapping[guid]["axis_group"].get(axis_group, {}).get("axis")
-                        if axis is not None:
-                            position[axis_name] = joystick.get_axis(axis)
-
+        for axis_name, axis in index["group_axes"].get(group, []):
+            if axis_values is not None and axis < len(axis_values):
+                value = axis_values[axis]
+            else:
+                value = joystick.get_axis(axis)
+            calibration = index["calibration"].get(axis)
+            if calibration is not None:
+                value = calibration.apply(value)
+            position[axis_name] = value
+
+        stick_filter = index["filters"].get(group)
+        if stick_filter is not None and position:
+            position["x"], position["y"] = stick_filter.apply(position.get("x", 0.0), position.get("y", 0.0))
         return position
 
     def get_group_for_axis(self, joystick, axis):
-        guid = joystick.get_guid()
-        axis_group = None
-        if guid in self.gamepad_mapping:
-            for group, axis_group_event in self.gamepad_mapping[guid]["axis_group"].items():
-                if axis_group_event["axis"] == axis:
-                    axis_group = group
-
-        if axis_group is not None:
-            for action_config in self.actions.values():
-                if action_config.get("axis_group") == axis_group:
-                    return action_config.get("group")
-
+        index = self.gamepad_index.get(joystick.get_guid())
+        if index is not None:
+            return index["axis_to_group"].get(axis)
         return None
 
     def get_group_for_hat(self, joystick, hat):
-        guid = joystick.get_guid()
-        hat_group = None
-        for group, hat_group_config in self.gamepad_mapping[guid]["hat_group"].items():
-            if hat_group_config["hat"] == hat:
-                hat_group = group
-
-        if hat_group is not None:
-            for action_config in self.actions.values():
-                if action_config.get("hat_group") == hat_group:
-                    return action_config.get("group")
+        index = self.gamepad_index.get(joystick.get_guid())
+        if index is not None:
+            return index["hat_to_group"].get(hat)
+        return None
 
     def set_gamepad_event_for_action(self, action, joystick, event, axis_group=None, hat_group=None):
         guid = joystick.get_guid()
@@ -230,6 +330,8 @@ class InputConfigManager(object):
             if existing_action is not None:
                 del self.gamepad_mapping[guid]["actions"][existing_action]
             self.gamepad_mapping[guid]["actions"][action] = event
+        self.dirty.add(guid)
+        self.index_gamepad(guid)
 
     def set_gamepad_button_for_action(self, action, joystick, button):
         self.set_gamepad_event_for_action(action, joystick, {"type": "button", "button": button})
@@ -255,57 +357,62 @@ class InputConfigManager(object):
 
             if action in self.gamepad_mapping[guid]["hat_group"]:
                 del self.gamepad_mapping[guid]["hat_group"][action]
+            self.dirty.add(guid)
+            self.index_gamepad(guid)
 
     def has_capability(self, action):
-        action_config = self.actions.get(action)
-        if action_config is not None:
-            needs = action_config.get("needs")
-            if needs is not None:
-                return self.robot_config.get(f"robot_has_{needs}", False)
-            else:
-                return True
-        else:
-            return False
+        return self.capabilities.get(action, False)
 
     def load(self):
-        # Actions
-        with open(os.path.join(self.config_path, "actions.json")) as action_file:
-            self.actions = json.load(action_file)
-
-        # Keyboard config
-        self.keyboard_mapping = {}
-        for config_path in [self.user_config_path, self.config_path]:
-            config_file_path = os.path.join(config_path, "keyboard.config.json")
-            if os.path.isfile(config_file_path):
-                with open(config_file_path) as config_file:
-                    try:
-                        self.keyboard_mapping = json.load(config_file)
-                    except:
-                        print(f"Unable to open config file {config_file_path}")
-                        continue
-                    break
-
-        # Gamepad config
-        self.gamepad_mapping = {}
-        for filename in os.listdir(self.user_config_path):
-            if filename.startswith("gamepad.") and filename.endswith(".config.json"):
-                with open(os.path.join(self.user_config_path, filename)) as config_file:
-                    try:
-                        gamepad_config = json.load(config_file)
-                        self.gamepad_mapping[gamepad_config["guid"]] = gamepad_config
-                    except:
-                        print(f"Unable to open config file {config_file_path}")
-                        continue
+        """Load the mappings from the shared store, returns False when nothing changed since the last load"""
+        snapshot = ConfigStore.get_instance().get_input_config(self.config_path, self.user_config_path)
+        if snapshot is self.snapshot and not self.dirty:
+            return False
+        self.snapshot = snapshot
+        self.consolidated = snapshot.consolidated
+        # Actions are never modified, the mappings are copied since the editor changes them
+        self.actions = snapshot.actions
+        self.keyboard_mapping = copy.deepcopy(snapshot.keyboard_mapping)
+        self.gamepad_mapping = copy.deepcopy(snapshot.gamepad_mapping)
+        self.build_indexes()
+        self.dirty = set()
+        return True
 
     def save(self):
-        # Keyboard config
+        """Write the mappings changed since the last save, the files are written by the store writer thread"""
+        if not self.dirty:
+            return
+        store = ConfigStore.get_instance()
         if not os.path.isdir(self.user_config_path):
             os.makedirs(self.user_config_path)
-        with open(os.path.join(self.user_config_path, "keyboard.config.json"), "w") as keyboard_config_file:
-            json.dump(self.keyboard_mapping, keyboard_config_file)
-        for guid, gamepad_config in self.gamepad_mapping.items():
-            with open(os.path.join(self.user_config_path, f"gamepad.{guid}.config.json"), "w") as gamepad_config_file:
-                json.dump(gamepad_config, gamepad_config_file)
+        if self.consolidated:
+            store.write_json_async(os.path.join(self.user_config_path, ConfigStore.CONSOLIDATED_FILE), {
+                "keyboard": self.keyboard_mapping,
+                "gamepads": self.gamepad_mapping,
+            })
+        else:
+            for key in self.dirty:
+                if key == "keyboard":
+                    store.write_json_async(
+                        os.path.join(self.user_config_path, "keyboard.config.json"), self.keyboard_mapping
+                    )
+                elif key in self.gamepad_mapping:
+                    store.write_json_async(
+                        os.path.join(self.user_config_path, f"gamepad.{key}.config.json"), self.gamepad_mapping[key]
+                    )
+        self.dirty = set()
+
+    def set_consolidated(self, consolidated):
+        """Switch between the single file store and the files per mapping, all the mappings are saved again"""
+        self.consolidated = consolidated
+        self.dirty.add("keyboard")
+        self.dirty.update(self.gamepad_mapping.keys())
+        self.save()
+        if not consolidated:
+            consolidated_file_path = os.path.join(self.user_config_path, ConfigStore.CONSOLIDATED_FILE)
+            ConfigStore.get_instance().flush()
+            if os.path.isfile(consolidated_file_path):
+                os.remove(consolidated_file_path)
 
 
 class KeyboardCaptureDialog(QDialog):
@@ -640,10 +747,12 @@ class InputConfigManagerPopup(QMainWindow):
         self.start_gamepad()
 
     def closeEvent(self, event):
+        from gamepad import GamePad
         GamePad.stop_gamepad()
         self.close_callback()
 
     def start_gamepad(self):
+        from gamepad import GamePad
         self.gamepad_added_signal.connect(self.gamepad_added_callback)
         self.gamepad_removed_signal.connect(self.gamepad_removed_callback)
         callback = {
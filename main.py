@@ -1,20 +1,75 @@
-from app import App
+import time
+
+START_TIME = time.perf_counter()
+
 import argparse
 import sys
 
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import QApplication, QStyleFactory
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Start PiRemote')
     parser.add_argument('--host', type=str, help='Server host name', required=False)
     parser.add_argument('-f', '--full_screen', action='store_true')
+    parser.add_argument('-r', '--max_command_rate', type=int, default=20,
+                        help='Maximum number of drive/camera setpoints sent per second')
+    parser.add_argument('-w', '--video_window', type=int, default=4,
+                        help='Initial number of video frames in flight, 0 to use the lock-step protocol')
+    parser.add_argument('-d', '--decode_workers', type=int, default=2,
+                        help='Number of threads decoding and converting video frames')
+    parser.add_argument('-g', '--grayscale', action='store_true', help='Decode the video stream in grayscale')
+    parser.add_argument('--gamepad_rate', type=int, default=100,
+                        help='Gamepad polling rate (Hz) while a stick is deflected, 0 to only wait for events')
+    parser.add_argument('--replay_seconds', type=int, default=10,
+                        help='Length of the instant replay (seconds)')
+    parser.add_argument('--replay_memory', type=int, default=32,
+                        help='Memory allocated to the instant replay (MB)')
+    parser.add_argument('--fleet', type=str, nargs='+', metavar='HOST',
+                        help='Control several robots from one window')
+    parser.add_argument('--background_fps', type=int, default=5,
+                        help='Frame rate of the robots not focused in fleet mode')
+    parser.add_argument('--watch_config', action='store_true',
+                        help='Reload the input mappings when their files change on disk')
+    parser.add_argument('--single_config_file', choices=['on', 'off'],
+                        help='Store the keyboard and all the gamepad mappings in a single file, or one file each')
     parser.add_argument('-s', '--style', type=str, help='QT style used for the app', choices=QStyleFactory.keys())
+    parser.add_argument('--startup_report', action='store_true',
+                        help='Print the time taken to show the main window and the slowest imports, then exit')
+    parser.add_argument('--exit_after_show', action='store_true', help=argparse.SUPPRESS)
     args = parser.parse_args()
 
+    if args.startup_report:
+        from startup_report import print_report, run_cold_start
+        main_args = [arg for arg in sys.argv[1:] if arg != '--startup_report']
+        print_report(run_cold_start(main_args))
+        sys.exit(0)
+
+    if args.single_config_file is not None:
+        from config_store import ConfigStore
+        from input_config_manager import InputConfigManager
+        InputConfigManager(robot_config={}).set_consolidated(args.single_config_file == 'on')
+        ConfigStore.get_instance().flush()
+
     app = QApplication(sys.argv)
     if args.style is not None:
         app.setStyle(args.style)
 
-    a = App(host=args.host, full_screen=args.full_screen)
+    if args.fleet:
+        from fleet import FleetWindow
+        a = FleetWindow(hosts=args.fleet, max_command_rate=args.max_command_rate,
+                        video_window=args.video_window or None, decode_workers=args.decode_workers,
+                        grayscale=args.grayscale, gamepad_rate=args.gamepad_rate,
+                        background_fps=args.background_fps)
+    else:
+        from app import App
+        a = App(host=args.host, full_screen=args.full_screen, max_command_rate=args.max_command_rate,
+                video_window=args.video_window or None, decode_workers=args.decode_workers,
+                grayscale=args.grayscale, gamepad_rate=args.gamepad_rate, replay_seconds=args.replay_seconds,
+                replay_memory=args.replay_memory, watch_config=args.watch_config)
     a.show()
+    if args.exit_after_show:
+        # On stderr, after the import times of the modules imported so far
+        print(f"Window shown after {1000 * (time.perf_counter() - START_TIME):.0f} ms", file=sys.stderr, flush=True)
+        QTimer.singleShot(0, app.quit)
     sys.exit(app.exec_())
@@ -0,0 +1,65 @@
+import struct
+
+
+class MessageCodec(object):
+    """Fixed size binary frames for the high rate setpoints, other messages are sent as JSON"""
+
+    FORMAT = "pirobot-struct-v1"
+
+    DRIVE_MOVE = 1
+    CAMERA_SET_POSITION = 2
+
+    # id, signed left speed, signed right speed, duration
+    DRIVE_MOVE_STRUCT = struct.Struct("!BbbH")
+    # id, position
+    CAMERA_SET_POSITION_STRUCT = struct.Struct("!BB")
+
+    # Arguments of drive/move which are constant for the axis controls
+    DRIVE_MOVE_DEFAULTS = dict(distance=None, rotation=None, auto_stop=False)
+
+    def encode(self, message):
+        """Return the binary frame for the message, None when it has to be sent as JSON"""
+        message_type = message.get("type")
+        action = message.get("action")
+        args = message.get("args", {})
+        try:
+            if message_type == "drive" and action == "move":
+                if any(args.get(key) != value for key, value in self.DRIVE_MOVE_DEFAULTS.items()):
+                    return None
+                if len(args) != len(self.DRIVE_MOVE_DEFAULTS) + 5:
+                    return None
+                left_speed = self.get_signed_speed(args["left_orientation"], args["left_speed"])
+                right_speed = self.get_signed_speed(args["right_orientation"], args["right_speed"])
+                return self.DRIVE_MOVE_STRUCT.pack(self.DRIVE_MOVE, left_speed, right_speed, args["duration"])
+            elif message_type == "camera" and action == "set_position" and list(args.keys()) == ["position"]:
+                return self.CAMERA_SET_POSITION_STRUCT.pack(self.CAMERA_SET_POSITION, args["position"])
+        except (KeyError, TypeError, struct.error):
+            pass
+        return None
+
+    def decode(self, data):
+        message_id = data[0]
+        if message_id == self.DRIVE_MOVE:
+            _, left_speed, right_speed, duration = self.DRIVE_MOVE_STRUCT.unpack(data)
+            args = dict(left_orientation="B" if left_speed < 0 else "F",
+                        left_speed=abs(left_speed),
+                        right_orientation="B" if right_speed < 0 else "F",
+                        right_speed=abs(right_speed),
+                        duration=duration)
+            args.update(self.DRIVE_MOVE_DEFAULTS)
+            return dict(type="drive", action="move", args=args)
+        elif message_id == self.CAMERA_SET_POSITION:
+            _, position = self.CAMERA_SET_POSITION_STRUCT.unpack(data)
+            return dict(type="camera", action="set_position", args=dict(position=position))
+        raise ValueError(f"Unknown message id {message_id}")
+
+    @staticmethod
+    def get_signed_speed(orientation, speed):
+        if orientation == "B":
+            if speed == 0:
+                # 0 backward can't be told apart from 0 forward
+                raise TypeError("Backward orientation with a null speed")
+            return -speed
+        elif orientation == "F":
+            return speed
+        raise TypeError(f"Unknown orientation {orientation}")
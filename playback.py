@@ -0,0 +1,180 @@
+import bisect
+import mmap
+import os
+import time
+from array import array
+
+from recorder import (
+    FOOTER_STRUCT,
+    HEADER_STRUCT,
+    INDEX_STRUCT,
+    RECORD_STRUCT,
+    RECORDING_MAGIC,
+    RECORDING_VERSION,
+)
+
+
+class RecordingTimestamps(object):
+    """Read-only sequence of the frame timestamps, read from the index when needed"""
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def __len__(self):
+        return len(self.reader)
+
+    def __getitem__(self, frame):
+        return self.reader.get_timestamp(frame)
+
+
+class RecordingReader(object):
+    """Memory-mapped recording, frames are only read from disk when requested"""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.file = open(file_path, "rb")
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = HEADER_STRUCT.unpack_from(self.mmap, 0)
+        if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+            self.close()
+            raise ValueError(f"{file_path} is not a recording")
+
+        self.index = None
+        self.index_offset = 0
+        self.frame_count = 0
+        footer_offset = len(self.mmap) - FOOTER_STRUCT.size
+        if footer_offset >= HEADER_STRUCT.size:
+            magic, index_offset, frame_count = FOOTER_STRUCT.unpack_from(self.mmap, footer_offset)
+            if magic == RECORDING_MAGIC and index_offset + frame_count * INDEX_STRUCT.size == footer_offset:
+                self.index_offset = index_offset
+                self.frame_count = frame_count
+        if not self.frame_count:
+            # Recording interrupted before the index was written
+            self.index = self.build_index()
+            self.frame_count = len(self.index[0])
+        self.timestamps = RecordingTimestamps(self)
+
+    def build_index(self):
+        offsets = array("Q")
+        timestamps = array("d")
+        offset = HEADER_STRUCT.size
+        while offset + RECORD_STRUCT.size <= len(self.mmap):
+            length, timestamp = RECORD_STRUCT.unpack_from(self.mmap, offset)
+            if offset + RECORD_STRUCT.size + length > len(self.mmap):
+                # Truncated last frame
+                break
+            offsets.append(offset)
+            timestamps.append(timestamp)
+            offset += RECORD_STRUCT.size + length
+        print(f"Rebuilt the index of {self.file_path}: {len(offsets)} frames")
+        return offsets, timestamps
+
+    def __len__(self):
+        return self.frame_count
+
+    def get_entry(self, frame):
+        if not 0 <= frame < self.frame_count:
+            raise IndexError(frame)
+        if self.index is not None:
+            return self.index[0][frame], self.index[1][frame]
+        return INDEX_STRUCT.unpack_from(self.mmap, self.index_offset + frame * INDEX_STRUCT.size)
+
+    def get_timestamp(self, frame):
+        return self.get_entry(frame)[1]
+
+    def get_frame(self, frame):
+        """JPEG data of the frame, only this frame is read"""
+        offset, _ = self.get_entry(frame)
+        length, _ = RECORD_STRUCT.unpack_from(self.mmap, offset)
+        start = offset + RECORD_STRUCT.size
+        return self.mmap[start:start + length]
+
+    def find_frame(self, timestamp):
+        """Last frame received at or before the timestamp"""
+        return max(bisect.bisect_right(self.timestamps, timestamp) - 1, 0)
+
+    @property
+    def start_time(self):
+        return self.get_timestamp(0) if self.frame_count else 0.0
+
+    @property
+    def duration(self):
+        return self.get_timestamp(self.frame_count - 1) - self.start_time if self.frame_count else 0.0
+
+    @property
+    def name(self):
+        return os.path.basename(self.file_path)
+
+    def close(self):
+        self.mmap.close()
+        self.file.close()
+
+
+class RecordingPlayer(object):
+    """Plays a recording at a given speed, tick() submits the frame due, if it changed"""
+
+    SPEEDS = [1, 2, 4, 8]
+
+    def __init__(self, reader, frame_callback):
+        self.reader = reader
+        self.frame_callback = frame_callback
+        self.speed = 1
+        # Position in the recording (seconds) at base_time, when playing
+        self.base_position = 0.0
+        self.base_time = None
+        self.current_frame = None
+
+        # Counters
+        self.frames_shown = 0
+        self.frames_skipped = 0
+
+    def is_playing(self):
+        return self.base_time is not None
+
+    def get_position(self):
+        if self.base_time is None:
+            return self.base_position
+        return min(self.base_position + (time.monotonic() - self.base_time) * self.speed, self.reader.duration)
+
+    def play(self):
+        if self.get_position() >= self.reader.duration:
+            # Restart from the beginning once the end is reached
+            self.base_position = 0.0
+        self.base_time = time.monotonic()
+
+    def pause(self):
+        self.base_position = self.get_position()
+        self.base_time = None
+
+    def set_speed(self, speed):
+        self.base_position = self.get_position()
+        if self.base_time is not None:
+            self.base_time = time.monotonic()
+        self.speed = speed
+
+    def seek(self, position):
+        self.base_position = min(max(position, 0.0), self.reader.duration)
+        if self.base_time is not None:
+            self.base_time = time.monotonic()
+        self.tick()
+
+    def seek_frame(self, frame):
+        self.seek(self.reader.get_timestamp(frame) - self.reader.start_time)
+
+    def tick(self):
+        if not len(self.reader):
+            return None
+        position = self.get_position()
+        if self.is_playing() and position >= self.reader.duration:
+            self.pause()
+        frame = self.reader.find_frame(self.reader.start_time + position)
+        if frame != self.current_frame:
+            if self.current_frame is not None and frame > self.current_frame:
+                self.frames_skipped += frame - self.current_frame - 1
+            self.current_frame = frame
+            self.frames_shown += 1
+            self.frame_callback(self.reader.get_frame(frame))
+        return frame
+
+    def get_status(self):
+        return f"{self.get_position():.1f}/{self.reader.duration:.1f}s x{self.speed}"
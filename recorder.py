@@ -0,0 +1,148 @@
+import os
+import queue
+import struct
+import threading
+import time
+from pathlib import Path
+
+# Recording file layout:
+#   header: magic, version
+#   records: frame length, timestamp, JPEG frame
+#   index (written on stop): offset and timestamp of each record
+#   footer: magic, index offset, frame count
+RECORDING_MAGIC = b"PIROBREC"
+RECORDING_VERSION = 1
+HEADER_STRUCT = struct.Struct("!8sH")
+RECORD_STRUCT = struct.Struct("!Id")
+INDEX_STRUCT = struct.Struct("!Qd")
+FOOTER_STRUCT = struct.Struct("!8sQI")
+RECORDING_EXTENSION = ".pirec"
+
+
+def get_recordings_path():
+    return os.path.join(Path.home(), ".pirobot-remote", "recordings")
+
+
+def get_recording_file_path(prefix="session"):
+    os.makedirs(get_recordings_path(), exist_ok=True)
+    return os.path.join(get_recordings_path(), time.strftime(f"{prefix}-%Y%m%d-%H%M%S") + RECORDING_EXTENSION)
+
+
+def write_index(recording_file, index, index_offset):
+    recording_file.write(b"".join(INDEX_STRUCT.pack(*entry) for entry in index))
+    recording_file.write(FOOTER_STRUCT.pack(RECORDING_MAGIC, index_offset, len(index)))
+
+
+def write_recording(file_path, frames):
+    """Write a complete recording of (timestamp, data) frames"""
+    index = []
+    with open(file_path, "wb") as recording_file:
+        recording_file.write(HEADER_STRUCT.pack(RECORDING_MAGIC, RECORDING_VERSION))
+        offset = HEADER_STRUCT.size
+        for timestamp, data in frames:
+            recording_file.write(RECORD_STRUCT.pack(len(data), timestamp))
+            recording_file.write(data)
+            index.append((offset, timestamp))
+            offset += RECORD_STRUCT.size + len(data)
+        write_index(recording_file, index, offset)
+    return file_path
+
+
+class SessionRecorder(object):
+    """Writes the received JPEG frames as is to disk, from a background thread"""
+
+    # Time given to the writer thread to take the stop request (seconds)
+    STOP_TIMEOUT = 2.0
+
+    def __init__(self, max_queue_size=120):
+        self.max_queue_size = max_queue_size
+        self.queue = None
+        self.thread = None
+        self.file_path = None
+        self.frames_written = 0
+        self.bytes_written = 0
+        self.dropped = 0
+        # Reason the writer thread stopped before being asked to, e.g. disk full
+        self.error = None
+
+    def is_recording(self):
+        return self.thread is not None
+
+    def start(self, file_path=None):
+        if self.is_recording():
+            self.stop()
+        if file_path is None:
+            file_path = get_recording_file_path()
+        self.file_path = file_path
+        self.frames_written = 0
+        self.bytes_written = 0
+        self.dropped = 0
+        self.error = None
+        self.queue = queue.Queue(maxsize=self.max_queue_size)
+        self.thread = threading.Thread(target=self.write_loop, args=(file_path, self.queue), daemon=True)
+        self.thread.start()
+        print(f"Recording video stream to {file_path}")
+        return file_path
+
+    def put(self, data, timestamp=None):
+        """Queue a frame, never blocks: frames are dropped when the disk can't keep up"""
+        frame_queue = self.queue
+        if frame_queue is None or self.error is not None:
+            return False
+        try:
+            frame_queue.put_nowait((data, time.time() if timestamp is None else timestamp))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def stop(self):
+        if not self.is_recording():
+            return None
+        if self.thread.is_alive():
+            try:
+                self.queue.put(None, timeout=self.STOP_TIMEOUT)
+                self.thread.join()
+            except queue.Full:
+                print("Recording writer not responding")
+        self.thread = None
+        self.queue = None
+        print(f"Recording stopped: {self.frames_written} frames written, {self.dropped} dropped")
+        return self.get_stats()
+
+    def write_loop(self, file_path, frame_queue):
+        try:
+            self.write_frames(file_path, frame_queue)
+        except OSError as e:
+            self.error = str(e)
+            print(f"Unable to write recording {file_path}: {e}")
+
+    def write_frames(self, file_path, frame_queue):
+        index = []
+        with open(file_path, "wb") as recording_file:
+            recording_file.write(HEADER_STRUCT.pack(RECORDING_MAGIC, RECORDING_VERSION))
+            offset = HEADER_STRUCT.size
+            while True:
+                item = frame_queue.get()
+                if item is None:
+                    break
+                data, timestamp = item
+                recording_file.write(RECORD_STRUCT.pack(len(data), timestamp))
+                recording_file.write(data)
+                index.append((offset, timestamp))
+                offset += RECORD_STRUCT.size + len(data)
+                self.frames_written += 1
+                self.bytes_written = offset
+
+            # Index for constant time seeking on playback
+            write_index(recording_file, index, offset)
+
+    def get_stats(self):
+        return {
+            "file_path": self.file_path,
+            "frames_written": self.frames_written,
+            "bytes_written": self.bytes_written,
+            "dropped": self.dropped,
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "error": self.error,
+        }
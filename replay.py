@@ -0,0 +1,126 @@
+import bisect
+import threading
+import time
+from array import array
+
+
+class ReplayBuffer(object):
+    """Last seconds of encoded frames, in a single preallocated buffer used as a ring"""
+
+    def __init__(self, seconds=10, max_bytes=32 * 1024 * 1024, max_frames=1024):
+        self.seconds = seconds
+        self.buffer = bytearray(max_bytes)
+        # Ring of the frames stored: offset in the buffer, length and timestamp
+        self.offsets = array("Q", [0] * max_frames)
+        self.lengths = array("I", [0] * max_frames)
+        self.timestamps = array("d", [0.0] * max_frames)
+        self.first = 0
+        self.count = 0
+        self.write_offset = 0
+        self.lock = threading.Lock()
+
+        # Counters
+        self.appended = 0
+        self.evicted = 0
+        self.too_large = 0
+
+    def __len__(self):
+        return self.count
+
+    def pop_oldest(self):
+        self.first = (self.first + 1) % len(self.offsets)
+        self.count -= 1
+        self.evicted += 1
+
+    def append(self, data, timestamp=None):
+        """Copy the frame in the buffer, evicting the oldest frames it overwrites"""
+        size = len(data)
+        if size > len(self.buffer):
+            self.too_large += 1
+            return False
+        with self.lock:
+            offset = self.write_offset
+            if offset + size > len(self.buffer):
+                # Not enough room before the end of the buffer, restart from the beginning
+                while self.count and self.offsets[self.first] >= offset:
+                    self.pop_oldest()
+                offset = 0
+            # The oldest frames are the ones right after the write offset
+            while self.count and offset <= self.offsets[self.first] < offset + size:
+                self.pop_oldest()
+            if self.count == len(self.offsets):
+                self.pop_oldest()
+
+            self.buffer[offset:offset + size] = data
+            slot = (self.first + self.count) % len(self.offsets)
+            self.offsets[slot] = offset
+            self.lengths[slot] = size
+            self.timestamps[slot] = time.time() if timestamp is None else timestamp
+            self.count += 1
+            self.write_offset = offset + size
+            self.appended += 1
+        return True
+
+    def get_frames(self, seconds=None):
+        """Copy of the (timestamp, data) frames received during the last seconds"""
+        if seconds is None:
+            seconds = self.seconds
+        with self.lock:
+            if not self.count:
+                return []
+            slots = [(self.first + i) % len(self.offsets) for i in range(self.count)]
+            start_time = self.timestamps[slots[-1]] - seconds
+            return [
+                (self.timestamps[slot], bytes(self.buffer[self.offsets[slot]:self.offsets[slot] + self.lengths[slot]]))
+                for slot in slots if self.timestamps[slot] >= start_time
+            ]
+
+    def get_stats(self):
+        with self.lock:
+            used = sum(self.lengths[(self.first + i) % len(self.offsets)] for i in range(self.count))
+            duration = 0.0
+            if self.count:
+                last = (self.first + self.count - 1) % len(self.offsets)
+                duration = self.timestamps[last] - self.timestamps[self.first]
+        return {
+            "frames": self.count,
+            "duration": duration,
+            "bytes_used": used,
+            "bytes_allocated": len(self.buffer),
+            "appended": self.appended,
+            "evicted": self.evicted,
+            "too_large": self.too_large,
+        }
+
+
+class ReplayClip(object):
+    """Frames copied from the replay buffer, played like a recording"""
+
+    def __init__(self, frames, name="Instant replay"):
+        self.frames = frames
+        self.timestamps = [timestamp for timestamp, _ in frames]
+        self.name = name
+
+    def __len__(self):
+        return len(self.frames)
+
+    def get_timestamp(self, frame):
+        return self.timestamps[frame]
+
+    def get_frame(self, frame):
+        return self.frames[frame][1]
+
+    def find_frame(self, timestamp):
+        return max(bisect.bisect_right(self.timestamps, timestamp) - 1, 0)
+
+    @property
+    def start_time(self):
+        return self.timestamps[0] if self.frames else 0.0
+
+    @property
+    def duration(self):
+        return self.timestamps[-1] - self.timestamps[0] if self.frames else 0.0
+
+    def close(self):
+        self.frames = []
+        self.timestamps = []
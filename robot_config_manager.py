@@ -1,8 +1,9 @@
 from functools import partial
 
-from PyQt5.QtCore import pyqtSignal, Qt
+from PyQt5.QtCore import pyqtSignal, Qt, QTimer
 from PyQt5.QtWidgets import (
     QApplication,
+    QCheckBox,
     QComboBox,
     QGridLayout,
     QGroupBox,
@@ -33,23 +34,154 @@ class ConfigLayout(QGridLayout):
         self.row += 1
 
 
+class ConfigEntry(object):
+    """Widgets of a robot configuration value, updated in place when the value changes"""
+
+    def __init__(self, config_name, config_item, layout, update_callback, reset_callback):
+        self.config_name = config_name
+        self.config_item = config_item
+        self.category = config_item.get("category") or "unknown"
+        # Value shown when the configuration was received, a different widget value is an edit in progress
+        self.received_value = None
+        # Set when the value was sent or reset, the next value received replaces the edit
+        self.pending = False
+
+        if self.is_bool():
+            self.value_widget = QComboBox()
+            self.value_widget.addItems(["Y", "N"])
+        elif "choices" in config_item:
+            self.value_widget = QComboBox()
+            self.value_widget.addItems(config_item["choices"])
+        else:
+            self.value_widget = QLineEdit()
+        self.label = QLabel()
+        self.update_button = QPushButton("Update")
+        self.update_button.clicked.connect(partial(update_callback, config_name, self.value_widget))
+        self.reset_button = QPushButton("Reset to default")
+        self.reset_button.clicked.connect(partial(reset_callback, config_name))
+        self.widgets = [self.label, self.value_widget, self.update_button, self.reset_button]
+        self.staged = False
+        for widget in self.widgets:
+            layout.addWidget(widget)
+        layout.newRow()
+        self.set_item(config_item)
+
+    def is_bool(self):
+        return self.config_item["type"] == "bool"
+
+    def is_compatible(self, config_item):
+        """Whether the widgets can show the item, else they must be created again"""
+        return (
+            (config_item.get("category") or "unknown") == self.category
+            and config_item["type"] == self.config_item["type"]
+            and config_item.get("choices") == self.config_item.get("choices")
+        )
+
+    def format_value(self, value):
+        if self.is_bool():
+            return "Y" if value else "N"
+        return str(value)
+
+    def get_widget_value(self):
+        if type(self.value_widget) == QComboBox:
+            return self.value_widget.currentText()
+        return self.value_widget.text()
+
+    def set_widget_value(self, value):
+        if type(self.value_widget) == QComboBox:
+            self.value_widget.setCurrentText(value)
+        else:
+            self.value_widget.setText(value)
+
+    def set_staged(self, staged, value=None):
+        """Highlight a value waiting for Apply all, value is shown in place of the edit"""
+        self.staged = staged
+        if value is not None:
+            self.set_widget_value(value)
+        self.value_widget.setStyleSheet("background-color: #665c00" if staged else "")
+
+    def get_default_value(self):
+        return self.format_value(self.config_item["default"])
+
+    def set_item(self, config_item):
+        self.label.setText(f"{self.config_name} (default: {self.format_value(config_item['default'])})")
+        value = self.format_value(config_item["value"])
+        edited = self.received_value is not None and self.get_widget_value() != self.received_value
+        if not edited or self.pending:
+            self.set_widget_value(value)
+        self.received_value = value
+        self.config_item = config_item
+        self.pending = False
+
+    def remove(self):
+        for widget in self.widgets:
+            widget.deleteLater()
+
+
 class RobotConfigManagerPopup(QMainWindow):
+    """Robot configuration editor
+
+    In staged mode, Update and Reset only stage the change and Apply all sends a single message:
+    {"type": "configuration", "action": "batch", "args": {"update": {key: value}, "delete": [key]}}
+    The robot applies it and replies once with the configuration, the action "batch" and the result of each key
+    in "results". A server replying without results, or not replying, gets the changes one key at a time.
+    """
     new_config_signal = pyqtSignal(dict)
 
+    # Time to wait for the reply to a batch before falling back to one message per key (milliseconds)
+    BATCH_TIMEOUT = 2000
+    # Per key messages are queued while the sender holds less than this share of its queue, so none is dropped
+    PER_KEY_QUEUE_SHARE = 0.25
+    PER_KEY_INTERVAL = 20
+
     def __init__(self, client):
         super().__init__()
         self.setWindowTitle("Robot Configuration")
         self.client = client
+        # Widgets kept between configuration messages, by config name and by category
+        self.entries = {}
+        self.category_group_boxes = {}
+        self.category_layouts = {}
+        self.category_sizes = {}
+        # Changes waiting for Apply all
+        self.staged_updates = {}
+        self.staged_deletes = set()
+        # Batch sent and not replied yet, and whether the robot supports batches
+        self.pending_batch = None
+        self.batch_supported = True
+        self.batch_timer = QTimer(self)
+        self.batch_timer.setSingleShot(True)
+        self.batch_timer.setInterval(self.BATCH_TIMEOUT)
+        self.batch_timer.timeout.connect(self.batch_timeout)
+        # Per key messages of the fallback not queued yet
+        self.per_key_messages = []
+        self.per_key_timer = QTimer(self)
+        self.per_key_timer.setInterval(self.PER_KEY_INTERVAL)
+        self.per_key_timer.timeout.connect(self.send_per_key_messages)
 
         self.scroll = QScrollArea()
         self.setCentralWidget(self.scroll)
         print()
 
         vbox = QVBoxLayout()
+        self.error_label = QLabel()
+        self.error_label.setStyleSheet("color: red; font-weight: bold")
+        self.error_label.hide()
+        vbox.addWidget(self.error_label)
         self.config_layout = QVBoxLayout()
         vbox.addLayout(self.config_layout)
 
         hbox = QHBoxLayout()
+        self.stage_checkbox = QCheckBox("Stage changes")
+        self.stage_checkbox.toggled.connect(self.stage_mode_changed)
+        hbox.addWidget(self.stage_checkbox)
+        self.discard_button = QPushButton("Discard")
+        self.discard_button.clicked.connect(self.discard_staged)
+        hbox.addWidget(self.discard_button)
+        self.apply_all_button = QPushButton()
+        self.apply_all_button.clicked.connect(self.apply_all)
+        hbox.addWidget(self.apply_all_button)
+        self.update_staged_buttons()
         close_button = QPushButton("Close")
         close_button.clicked.connect(self.close)
         close_button.setFocus()
@@ -78,6 +210,14 @@ class RobotConfigManagerPopup(QMainWindow):
         else:
             config_value = widget.text()
 
+        if self.stage_checkbox.isChecked():
+            self.staged_deletes.discard(config_name)
+            self.staged_updates[config_name] = config_value
+            self.entries[config_name].set_staged(True)
+            self.update_staged_buttons()
+            return
+
+        self.entries[config_name].pending = True
         self.client.send_message(
             dict(
                 type="configuration",
@@ -87,72 +227,170 @@ class RobotConfigManagerPopup(QMainWindow):
         )
 
     def reset_config_value(self, config_name):
+        if self.stage_checkbox.isChecked():
+            self.staged_updates.pop(config_name, None)
+            self.staged_deletes.add(config_name)
+            entry = self.entries[config_name]
+            entry.set_staged(True, entry.get_default_value())
+            self.update_staged_buttons()
+            return
+
+        self.entries[config_name].pending = True
         self.client.send_message(
             dict(type="configuration", action="delete", args=dict(key=config_name))
         )
 
-    def update_config(self, message):
-        config = message["config"]
-        success = message["success"]
-        action = message["action"]
+    def stage_mode_changed(self, staged):
+        if not staged:
+            self.discard_staged()
+        self.update_staged_buttons()
 
-        # Generate config category
-        config_by_category = {}
-        for config_name, config_item in config.items():
-            category = config_item.get("category")
-            if category == "debug":
-                continue
-            if category is None:
-                category = "unknown"
-            if category not in config_by_category:
-                config_by_category[category] = {}
-            config_by_category[category][config_name] = config_item
-
-        # Clear config box
-        for i in reversed(range(self.config_layout.count())):
-            self.config_layout.itemAt(i).widget().deleteLater()
-
-        if not success and action == "update":
-            label = QLabel("Unable to update config")
-            label.setStyleSheet("color: red; font-weight: bold")
-            self.config_layout.addWidget(label)
-
-        # Add config value
-        for category in config_by_category.keys():
+    def update_staged_buttons(self):
+        staged = self.stage_checkbox.isChecked()
+        count = len(self.staged_updates) + len(self.staged_deletes)
+        self.apply_all_button.setText(f"Apply all ({count})")
+        self.apply_all_button.setVisible(staged)
+        self.apply_all_button.setEnabled(count > 0 and self.pending_batch is None)
+        self.discard_button.setVisible(staged)
+        self.discard_button.setEnabled(count > 0)
+
+    def discard_staged(self):
+        for config_name in list(self.staged_updates) + list(self.staged_deletes):
+            entry = self.entries.get(config_name)
+            if entry is not None:
+                entry.set_staged(False, entry.received_value)
+        self.staged_updates = {}
+        self.staged_deletes = set()
+        self.update_staged_buttons()
+
+    def apply_all(self):
+        updates, deletes = self.staged_updates, sorted(self.staged_deletes)
+        if not updates and not deletes:
+            return
+        for config_name in list(updates) + deletes:
+            entry = self.entries[config_name]
+            entry.set_staged(False)
+            entry.pending = True
+        self.staged_updates = {}
+        self.staged_deletes = set()
+
+        if self.batch_supported:
+            self.pending_batch = (updates, deletes)
+            self.batch_timer.start()
+            self.client.send_message(
+                dict(type="configuration", action="batch", args=dict(update=updates, delete=deletes))
+            )
+        else:
+            self.send_per_key(updates, deletes)
+        self.update_staged_buttons()
+
+    def send_per_key(self, updates, deletes):
+        """Fallback for the servers not supporting batches, one reply per key"""
+        for config_name, config_value in updates.items():
+            self.per_key_messages.append(
+                dict(type="configuration", action="update", args=dict(key=config_name, value=config_value))
+            )
+        for config_name in deletes:
+            self.per_key_messages.append(dict(type="configuration", action="delete", args=dict(key=config_name)))
+        self.send_per_key_messages()
+
+    def send_per_key_messages(self):
+        """Queue the messages the sender has room for, the sender drops its oldest messages when full"""
+        sender = self.client.sender
+        room = max(int(sender.max_size * self.PER_KEY_QUEUE_SHARE) - sender.depth(), 0)
+        messages, self.per_key_messages = self.per_key_messages[:room], self.per_key_messages[room:]
+        for message in messages:
+            self.client.send_message(message)
+        if self.per_key_messages:
+            self.per_key_timer.start()
+        else:
+            self.per_key_timer.stop()
+
+    def batch_unsupported(self):
+        print("Configuration batches not supported by the robot, sending one message per key")
+        self.batch_supported = False
+        self.batch_timer.stop()
+        updates, deletes = self.pending_batch
+        self.pending_batch = None
+        self.send_per_key(updates, deletes)
+        self.update_staged_buttons()
+
+    def batch_timeout(self):
+        if self.pending_batch is not None:
+            self.batch_unsupported()
+
+    def get_category_layout(self, category):
+        if category not in self.category_layouts:
             category_group_box = QGroupBox(category.upper())
             self.config_layout.addWidget(category_group_box)
             category_config_layout = ConfigLayout()
             category_group_box.setLayout(category_config_layout)
-            for config_name, config_item in config_by_category[category].items():
-                config_type = config_item["type"]
-                # Config Value
-                default_value = config_item["default"]
-                if config_type == "bool":
-                    config_value_widget = QComboBox()
-                    config_value_widget.addItems(["Y", "N"])
-                    config_value_widget.setCurrentText("Y" if config_item["value"] else "N")
-                    default_value = "Y" if config_item["default"] else "N"
-                elif "choices" in config_item:
-                    config_value_widget = QComboBox()
-                    config_value_widget.addItems(config_item["choices"])
-                    config_value_widget.setCurrentText(str(config_item["value"]))
+            self.category_group_boxes[category] = category_group_box
+            self.category_layouts[category] = category_config_layout
+            self.category_sizes[category] = 0
+        return self.category_layouts[category]
+
+    def add_entry(self, config_name, config_item):
+        category = config_item.get("category") or "unknown"
+        self.entries[config_name] = ConfigEntry(
+            config_name, config_item, self.get_category_layout(category),
+            self.update_config_value, self.reset_config_value
+        )
+        self.category_sizes[category] += 1
+
+    def remove_entry(self, config_name):
+        entry = self.entries.pop(config_name)
+        entry.remove()
+        self.staged_updates.pop(config_name, None)
+        self.staged_deletes.discard(config_name)
+        self.category_sizes[entry.category] -= 1
+        if not self.category_sizes[entry.category]:
+            self.category_group_boxes.pop(entry.category).deleteLater()
+            del self.category_layouts[entry.category]
+            del self.category_sizes[entry.category]
+
+    def update_config(self, message):
+        """Apply the differences with the configuration shown, the widgets of unchanged values are left as is"""
+        action = message.get("action")
+        if action == "batch" and self.pending_batch is not None:
+            if "results" not in message:
+                # Action unknown to the robot
+                self.batch_unsupported()
+                return
+            self.pending_batch = None
+            self.batch_timer.stop()
+            self.update_staged_buttons()
+        config = message["config"]
+        success = message["success"]
+
+        if action == "batch" and "results" in message:
+            failed = sorted(config_name for config_name, result in message["results"].items() if not result)
+            if failed:
+                self.error_label.setText(f"Unable to update config: {', '.join(failed)}")
+                self.error_label.show()
+            else:
+                self.error_label.hide()
+        elif not success and action in ["update", "delete"]:
+            self.error_label.setText("Unable to update config" if action == "update" else "Unable to reset config")
+            self.error_label.show()
+        else:
+            self.error_label.hide()
+
+        config = {
+            config_name: config_item for config_name, config_item in config.items()
+            if config_item.get("category") != "debug"
+        }
+        for config_name in [config_name for config_name in self.entries if config_name not in config]:
+            self.remove_entry(config_name)
+        for config_name, config_item in config.items():
+            entry = self.entries.get(config_name)
+            if entry is None:
+                self.add_entry(config_name, config_item)
+            elif config_item != entry.config_item:
+                if entry.is_compatible(config_item):
+                    entry.set_item(config_item)
                 else:
-                    config_value_widget = QLineEdit()
-                    config_value_widget.setText(str(config_item["value"]))
-
-                # Config Name
-                category_config_layout.addWidget(QLabel(f"{config_name} (default: {default_value})"))
-                category_config_layout.addWidget(config_value_widget)
-
-                # Update Button
-                update_button = QPushButton("Update")
-                update_button.clicked.connect(
-                    partial(self.update_config_value, config_name, config_value_widget)
-                )
-                category_config_layout.addWidget(update_button)
-
-                # Reset Button
-                reset_button = QPushButton("Reset to default")
-                reset_button.clicked.connect(partial(self.reset_config_value, config_name))
-                category_config_layout.addWidget(reset_button)
-                category_config_layout.newRow()
+                    self.remove_entry(config_name)
+                    self.add_entry(config_name, config_item)
+            else:
+                entry.pending = False
@@ -0,0 +1,170 @@
+import asyncio
+import collections
+import json
+import threading
+import time
+
+
+class MessageSender(object):
+    """Bounded outbound message queue, drained by the event loop owning the websocket"""
+
+    # Setpoints, only the latest pending one is sent
+    COALESCED_MESSAGES = {("drive", "move"), ("camera", "set_position")}
+    # Sent immediately, cancel the pending setpoints of the same type
+    BYPASS_MESSAGES = {("drive", "stop"), ("camera", "center_position")}
+
+    def __init__(self, max_size=64, max_rate=20):
+        self.max_size = max_size
+        # Maximum number of setpoints per second for each (type, action)
+        self.max_rate = max_rate
+        self.queue = collections.deque()
+        self.pending = {}
+        self.last_sent = {}
+        self.last_flush = {}
+        self.lock = threading.Lock()
+        self.loop = None
+        self.wakeup = None
+        # Binary codec negotiated with the server, None to only send JSON
+        self.codec = None
+
+        # Counters
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.binary = 0
+        self.bytes_sent = 0
+        self.suppressed = 0
+        self.superseded = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def is_attached(self):
+        return self.loop is not None
+
+    @staticmethod
+    def get_key(message):
+        return message.get("type"), message.get("action")
+
+    def put(self, message):
+        """Queue a message for sending, can be called from any thread and never blocks"""
+        loop, wakeup = self.loop, self.wakeup
+        if loop is None or wakeup is None:
+            # Not connected, commands must not be replayed on reconnect
+            self.dropped += 1
+            print("Unable to send message")
+            return False
+
+        key = self.get_key(message)
+        with self.lock:
+            if key in self.COALESCED_MESSAGES:
+                if key in self.pending:
+                    del self.pending[key]
+                    self.superseded += 1
+                if message == self.last_sent.get(key):
+                    # Robot already has this setpoint
+                    self.suppressed += 1
+                    return False
+                self.pending[key] = (time.monotonic(), message)
+            else:
+                if key in self.BYPASS_MESSAGES:
+                    for pending_key in [k for k in self.pending if k[0] == key[0]]:
+                        del self.pending[pending_key]
+                        self.superseded += 1
+                    for sent_key in [k for k in self.last_sent if k[0] == key[0]]:
+                        del self.last_sent[sent_key]
+                if len(self.queue) >= self.max_size:
+                    # Keep the most recent commands
+                    self.queue.popleft()
+                    self.dropped += 1
+                self.queue.append((time.monotonic(), message))
+
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            # Loop closed in the meantime
+            pass
+        return True
+
+    def pop(self):
+        """Return the next message to send and the delay before the next pending setpoint is due"""
+        with self.lock:
+            if self.queue:
+                return self.queue.popleft(), 0
+            now = time.monotonic()
+            min_interval = 1.0 / self.max_rate if self.max_rate else 0
+            next_delay = None
+            for key in list(self.pending.keys()):
+                delay = self.last_flush.get(key, 0) + min_interval - now
+                if delay <= 0:
+                    item = self.pending.pop(key)
+                    self.last_flush[key] = now
+                    self.last_sent[key] = item[1]
+                    return item, 0
+                next_delay = delay if next_delay is None else min(next_delay, delay)
+        return None, next_delay
+
+    def depth(self):
+        return len(self.queue) + len(self.pending)
+
+    async def run(self, ws):
+        """Drain the queue into the websocket until the connection is closed"""
+        self.wakeup = asyncio.Event()
+        self.loop = asyncio.get_running_loop()
+        next_delay = None
+        try:
+            while not ws.closed:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=next_delay)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
+                item, next_delay = self.pop()
+                while item is not None:
+                    queued_ts, message = item
+                    try:
+                        await self.send(ws, message)
+                    except (ConnectionError, RuntimeError):
+                        self.failed += 1
+                        print("Unable to send message")
+                        return
+                    latency = time.monotonic() - queued_ts
+                    self.sent += 1
+                    self.total_latency += latency
+                    self.max_latency = max(self.max_latency, latency)
+                    item, next_delay = self.pop()
+        finally:
+            self.detach()
+
+    async def send(self, ws, message):
+        data = self.codec.encode(message) if self.codec is not None else None
+        if data is not None:
+            self.binary += 1
+            await ws.send_bytes(data)
+        else:
+            data = json.dumps(dict(topic="robot", message=message))
+            await ws.send_str(data)
+        self.bytes_sent += len(data)
+
+    def detach(self):
+        self.loop = None
+        self.wakeup = None
+        self.codec = None
+        with self.lock:
+            self.dropped += len(self.queue)
+            self.queue.clear()
+            self.pending.clear()
+            self.last_sent.clear()
+
+    def get_stats(self):
+        return {
+            "queue_depth": self.depth(),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "binary": self.binary,
+            "bytes_sent": self.bytes_sent,
+            "suppressed": self.suppressed,
+            "superseded": self.superseded,
+            "avg_latency_ms": 1000 * self.total_latency / self.sent if self.sent else 0.0,
+            "max_latency_ms": 1000 * self.max_latency,
+        }
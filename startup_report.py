@@ -0,0 +1,66 @@
+import os
+import re
+import subprocess
+import sys
+import time
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+# Modules expected to be imported after the main window is shown
+DEFERRED_MODULES = ["cv2", "numpy", "pygame", "aiohttp"]
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+WINDOW_SHOWN_PATTERN = re.compile(r"^Window shown after (\d+) ms$")
+
+
+def parse_import_times(output):
+    """Modules imported, as reported by python -X importtime, with their self and cumulative times (ms)"""
+    imports = []
+    for line in output.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match is not None:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append({
+                "module": module,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+                # Nesting level, 0 for the modules imported by main.py itself
+                "level": (len(indent) - 1) // 2,
+            })
+    return imports
+
+
+def run_cold_start(main_args=(), env=None):
+    """Start the client until its window is shown, with the import times"""
+    command = [sys.executable, "-X", "importtime", MAIN_PATH, "--exit_after_show"] + list(main_args)
+    start = time.perf_counter()
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env)
+    elapsed = time.perf_counter() - start
+    # Only the modules imported before the window was shown are reported
+    window_shown_ms = None
+    lines = process.stderr.splitlines()
+    for index, line in enumerate(lines):
+        match = WINDOW_SHOWN_PATTERN.match(line.strip())
+        if match is not None:
+            window_shown_ms = int(match.group(1))
+            lines = lines[:index]
+            break
+    imports = parse_import_times("\n".join(lines))
+    imported = {entry["module"].split(".")[0] for entry in imports}
+    return {
+        "returncode": process.returncode,
+        "process_ms": 1000 * elapsed,
+        "window_shown_ms": window_shown_ms,
+        "import_ms": sum(entry["self_ms"] for entry in imports),
+        "modules_imported": len(imports),
+        "deferred_modules_imported": [module for module in DEFERRED_MODULES if module in imported],
+        "imports": imports,
+    }
+
+
+def print_report(result, top=20):
+    print(f"Process: {result['process_ms']:.0f} ms, main window shown after {result['window_shown_ms']} ms "
+          f"of main.py, {result['modules_imported']} modules imported in {result['import_ms']:.0f} ms")
+    if result["deferred_modules_imported"]:
+        print(f"Imported before the window was shown: {', '.join(result['deferred_modules_imported'])}")
+    print("Slowest imports (cumulative):")
+    for entry in sorted(result["imports"], key=lambda entry: entry["cumulative_ms"], reverse=True)[:top]:
+        print(f"  {entry['cumulative_ms']:8.1f} ms  {'  ' * entry['level']}{entry['module']}")
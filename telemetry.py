@@ -0,0 +1,284 @@
+import math
+import threading
+import time
+
+import numpy as np
+from PyQt5.QtCore import QPointF, Qt, QTimer
+from PyQt5.QtGui import QColor, QPainter, QPen, QPolygonF
+from PyQt5.QtWidgets import (
+    QComboBox,
+    QDockWidget,
+    QFileDialog,
+    QHBoxLayout,
+    QPushButton,
+    QVBoxLayout,
+    QWidget,
+)
+
+
+def flatten_values(message, prefix="", ignored=("config",)):
+    """Numeric fields of a message, nested fields named with dots"""
+    values = {}
+    for key, value in message.items():
+        if key in ignored:
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, bool):
+            values[name] = float(value)
+        elif isinstance(value, (int, float)):
+            values[name] = value
+        elif isinstance(value, dict):
+            values.update(flatten_values(value, prefix=f"{name}.", ignored=()))
+    return values
+
+
+def minmax_decimate(t, y, bins):
+    """Min and max of each bin, keeps the peaks that plain subsampling would miss"""
+    if len(t) <= 2 * bins:
+        return t, y
+    size = len(t) // bins
+    count = size * bins
+    y_bins = y[:count].reshape(bins, size)
+    t_bins = t[:count].reshape(bins, size)
+    rows = np.arange(bins)
+    # NaN (field missing) must not be picked as min or max
+    filled = np.where(np.isnan(y_bins), np.nanmean(y) if np.any(~np.isnan(y)) else 0.0, y_bins)
+    min_index = filled.argmin(axis=1)
+    max_index = filled.argmax(axis=1)
+    # Keep both points of each bin in time order
+    first = np.minimum(min_index, max_index)
+    second = np.maximum(min_index, max_index)
+    t_out = np.column_stack([t_bins[rows, first], t_bins[rows, second]]).ravel()
+    y_out = np.column_stack([y_bins[rows, first], y_bins[rows, second]]).ravel()
+    return t_out, y_out
+
+
+def lttb_decimate(t, y, threshold):
+    """Largest triangle three buckets downsampling, keeps the visual shape with threshold points"""
+    length = len(t)
+    if threshold >= length or threshold < 3:
+        return t, y
+    y = np.nan_to_num(y)
+    every = (length - 2) / (threshold - 2)
+    indexes = np.empty(threshold, dtype=np.int64)
+    indexes[0] = 0
+    indexes[-1] = length - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(math.floor(i * every)) + 1
+        end = int(math.floor((i + 1) * every)) + 1
+        next_start = end
+        next_end = min(int(math.floor((i + 2) * every)) + 1, length)
+        avg_t = t[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        # Point of the bucket forming the largest triangle with the previous point and the next bucket average
+        areas = np.abs(
+            (t[a] - avg_t) * (y[start:end] - y[a]) - (t[a] - t[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(areas.argmax())
+        indexes[i + 1] = a
+    return t[indexes], y[indexes]
+
+
+class TelemetryBuffer(object):
+    """Preallocated ring buffers of the numeric telemetry fields, sharing one time axis"""
+
+    def __init__(self, capacity=360000, max_fields=32):
+        self.capacity = capacity
+        self.max_fields = max_fields
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.fields = {}
+        self.write_index = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+        # Counters
+        self.appended = 0
+        self.ignored_fields = set()
+
+    def append(self, values, timestamp=None):
+        """Add a sample, fields missing from the sample are NaN"""
+        with self.lock:
+            index = self.write_index
+            self.timestamps[index] = time.time() if timestamp is None else timestamp
+            for name, series in self.fields.items():
+                series[index] = values.get(name, np.nan)
+            for name in values.keys() - self.fields.keys():
+                if len(self.fields) >= self.max_fields:
+                    self.ignored_fields.add(name)
+                    continue
+                # Allocated once, the first time the field is seen
+                series = np.full(self.capacity, np.nan, dtype=np.float32)
+                series[index] = values[name]
+                self.fields[name] = series
+            self.write_index = (index + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+            self.appended += 1
+
+    def append_message(self, message):
+        self.append(flatten_values(message))
+
+    def get_field_names(self):
+        with self.lock:
+            return sorted(self.fields.keys())
+
+    def ordered(self, array):
+        if self.count < self.capacity:
+            return array[:self.count]
+        return np.concatenate([array[self.write_index:], array[:self.write_index]])
+
+    def get_series(self, name, duration=None):
+        """Copy of the timestamps and values of a field, oldest first, over the last duration seconds"""
+        with self.lock:
+            if name not in self.fields or not self.count:
+                return np.empty(0), np.empty(0)
+            t = self.ordered(self.timestamps)
+            y = self.ordered(self.fields[name])
+        if duration is not None:
+            start = np.searchsorted(t, t[-1] - duration)
+            t, y = t[start:], y[start:]
+        return t, y
+
+    def export_npy(self, file_path):
+        """Structured array with a time column and one column per field"""
+        with self.lock:
+            names = sorted(self.fields.keys())
+            data = np.empty(self.count, dtype=[("time", np.float64)] + [(name, np.float32) for name in names])
+            data["time"] = self.ordered(self.timestamps)
+            for name in names:
+                data[name] = self.ordered(self.fields[name])
+        np.save(file_path, data)
+
+    def export_csv(self, file_path):
+        with self.lock:
+            names = sorted(self.fields.keys())
+            columns = [self.ordered(self.timestamps)] + [self.ordered(self.fields[name]) for name in names]
+        np.savetxt(file_path, np.column_stack(columns), delimiter=",", header=",".join(["time"] + names),
+                   comments="", fmt="%.6f")
+
+    def get_stats(self):
+        return {
+            "samples": self.count,
+            "appended": self.appended,
+            "fields": len(self.fields),
+            "ignored_fields": sorted(self.ignored_fields),
+            "bytes_allocated": self.timestamps.nbytes + sum(series.nbytes for series in self.fields.values()),
+        }
+
+
+class TelemetryPlot(QWidget):
+    """Line plot of already decimated points, the drawing cost only depends on the widget width"""
+
+    MARGIN = 30
+
+    def __init__(self):
+        super().__init__()
+        self.setMinimumSize(300, 150)
+        self.t = np.empty(0)
+        self.y = np.empty(0)
+
+    def set_series(self, t, y):
+        self.t = t
+        self.y = y
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("#202020"))
+        valid = ~np.isnan(self.y)
+        if not valid.any():
+            return
+        t, y = self.t[valid], self.y[valid]
+        width = self.width() - 2 * self.MARGIN
+        height = self.height() - 2 * self.MARGIN
+        t_min, t_max = t[0], t[-1]
+        y_min, y_max = float(y.min()), float(y.max())
+        t_range = max(t_max - t_min, 1e-9)
+        y_range = max(y_max - y_min, 1e-9)
+        xs = self.MARGIN + (t - t_min) * width / t_range
+        ys = self.MARGIN + height - (y - y_min) * height / y_range
+
+        painter.setPen(QPen(QColor("#2a82da"), 1))
+        painter.drawPolyline(QPolygonF([QPointF(x, y) for x, y in zip(xs.tolist(), ys.tolist())]))
+        painter.setPen(QColor("#c0c0c0"))
+        painter.drawText(2, self.MARGIN - 5, f"{y_max:.3g}")
+        painter.drawText(2, self.MARGIN + height + 15, f"{y_min:.3g}")
+        painter.drawText(self.width() - self.MARGIN - 60, self.height() - 5, f"{t_range:.0f} s")
+
+
+class TelemetryPanel(QDockWidget):
+    """Dockable live plot of a telemetry field"""
+
+    WINDOWS = [("1 min", 60), ("10 min", 600), ("1 hour", 3600), ("All", None)]
+    DECIMATIONS = [("Min/Max", "minmax"), ("LTTB", "lttb")]
+    REFRESH_INTERVAL = 200
+
+    def __init__(self, telemetry, parent=None):
+        super().__init__("Telemetry", parent)
+        self.telemetry = telemetry
+
+        widget = QWidget()
+        vbox = QVBoxLayout()
+        hbox = QHBoxLayout()
+        self.field_selection = QComboBox()
+        self.field_selection.setFocusPolicy(Qt.NoFocus)
+        hbox.addWidget(self.field_selection)
+        self.window_selection = QComboBox()
+        self.window_selection.setFocusPolicy(Qt.NoFocus)
+        for name, duration in self.WINDOWS:
+            self.window_selection.addItem(name, duration)
+        hbox.addWidget(self.window_selection)
+        self.decimation_selection = QComboBox()
+        self.decimation_selection.setFocusPolicy(Qt.NoFocus)
+        for name, decimation in self.DECIMATIONS:
+            self.decimation_selection.addItem(name, decimation)
+        hbox.addWidget(self.decimation_selection)
+        export_button = QPushButton("Export")
+        export_button.setFocusPolicy(Qt.NoFocus)
+        export_button.clicked.connect(self.export)
+        hbox.addWidget(export_button)
+        vbox.addLayout(hbox)
+        self.plot = TelemetryPlot()
+        vbox.addWidget(self.plot)
+        widget.setLayout(vbox)
+        self.setWidget(widget)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.REFRESH_INTERVAL)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start()
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+        field_names = self.telemetry.get_field_names()
+        if len(field_names) != self.field_selection.count():
+            current = self.field_selection.currentText()
+            self.field_selection.blockSignals(True)
+            self.field_selection.clear()
+            self.field_selection.addItems(field_names)
+            if current in field_names:
+                self.field_selection.setCurrentText(current)
+            self.field_selection.blockSignals(False)
+        if not field_names:
+            return
+
+        t, y = self.telemetry.get_series(self.field_selection.currentText(), self.window_selection.currentData())
+        # About one point per pixel, whatever the number of samples
+        points = max(self.plot.width(), 2)
+        if self.decimation_selection.currentData() == "lttb":
+            t, y = lttb_decimate(t, y, points)
+        else:
+            t, y = minmax_decimate(t, y, points // 2)
+        self.plot.set_series(t, y)
+
+    def export(self):
+        file_path, file_filter = QFileDialog.getSaveFileName(
+            self, "Export Telemetry", "telemetry.csv", "CSV (*.csv);;NumPy (*.npy)"
+        )
+        if not file_path:
+            return
+        if file_path.endswith(".npy"):
+            self.telemetry.export_npy(file_path)
+        else:
+            self.telemetry.export_csv(file_path)
@@ -0,0 +1,165 @@
+import asyncio
+import collections
+import math
+import time
+import traceback
+
+from aiohttp import WSMsgType
+
+from connection import Reconnector, get_session
+
+
+class FlowControl(object):
+    """Credit based flow control, keeps enough frames in flight to cover the round trip"""
+
+    SAMPLE_COUNT = 32
+    ALPHA = 0.2
+
+    def __init__(self, window, min_window=1, max_window=16, max_fps=60):
+        self.window = window
+        self.min_window = min_window
+        self.max_window = max_window
+        self.max_fps = max_fps
+        # Credits granted to the server and not used yet
+        self.outstanding = 0
+        self.credit_ts = collections.deque()
+        self.turnaround_samples = collections.deque(maxlen=self.SAMPLE_COUNT)
+        self.decode_time = None
+
+    def grant(self, credits):
+        now = time.monotonic()
+        self.outstanding += credits
+        self.credit_ts.extend([now] * credits)
+
+    def on_frame(self):
+        if self.credit_ts:
+            self.turnaround_samples.append(time.monotonic() - self.credit_ts.popleft())
+        self.outstanding = max(self.outstanding - 1, 0)
+
+    def on_decoded(self, duration):
+        if self.decode_time is None:
+            self.decode_time = duration
+        else:
+            self.decode_time += self.ALPHA * (duration - self.decode_time)
+
+    def get_rtt(self):
+        # The minimum filters out the time credits spent waiting for a new camera frame
+        return min(self.turnaround_samples) if self.turnaround_samples else None
+
+    def update_window(self):
+        rtt = self.get_rtt()
+        if rtt is not None:
+            frame_interval = max(self.decode_time or 0.0, 1.0 / self.max_fps)
+            window = math.ceil(rtt / frame_interval) + 1
+            self.window = min(max(window, self.min_window), self.max_window)
+        return self.window
+
+    def get_credits_to_return(self):
+        """Credits are returned in batches of half a window, to limit the uplink traffic"""
+        missing = self.update_window() - self.outstanding
+        if missing >= max(1, self.window // 2) or (missing > 0 and self.outstanding == 0):
+            return missing
+        return 0
+
+
+class VideoStream(object):
+    FPS_UPDATE_INTERVAL = 1
+    # Time to wait for the server to acknowledge the windowed mode
+    ACK_TIMEOUT = 0.5
+
+    def __init__(self, frame_callback, window=4, max_window=16, decode_time=None):
+        # Called with each encoded frame
+        self.frame_callback = frame_callback
+        # Returns the average time to process a frame when frame_callback hands it over to other threads
+        self.decode_time = decode_time
+        # Initial number of frames in flight, None to always use the lock-step protocol
+        self.window = window
+        self.max_window = max_window
+        self.window_supported = {}
+        self.reconnector = Reconnector()
+        self.flow_control = None
+        self.mode = None
+        self.fps = 0
+        self.frame_counter = 0
+        self.last_frame_ts = 0
+
+    async def connect(self, host):
+        url = f"http://{host}/ws/video_stream"
+        while True:
+            try:
+                async with get_session(host).ws_connect(url, receive_timeout=10.0) as ws:
+                    print(f"Connected to {url}")
+                    self.reconnector.on_connected()
+                    await self.stream(ws, host)
+            except asyncio.CancelledError:
+                raise
+            except:
+                traceback.print_exc()
+            self.reconnector.on_disconnected()
+            print(f"Unable to connect to {url}, reconnecting")
+            await asyncio.sleep(self.reconnector.next_delay())
+
+    async def negotiate(self, ws, host):
+        """Request the windowed mode, return the first message received if the server ignored it"""
+        self.flow_control = None
+        if self.window is None or not self.window_supported.get(host, True):
+            return None
+
+        await ws.send_str(f"window {self.window}")
+        try:
+            msg = await ws.receive(timeout=self.ACK_TIMEOUT)
+        except asyncio.TimeoutError:
+            msg = None
+        if msg is not None and msg.type == WSMsgType.TEXT and msg.data.startswith("window"):
+            window = int(msg.data.split()[1])
+            self.flow_control = FlowControl(window=window, max_window=self.max_window)
+            self.flow_control.grant(window)
+            self.window_supported[host] = True
+            print(f"Video stream using a window of {window} frames")
+            return None
+
+        print("Windowed video stream not supported by the server, using lock-step mode")
+        self.window_supported[host] = False
+        return msg
+
+    async def stream(self, ws, host):
+        msg = await self.negotiate(ws, host)
+        if self.flow_control is None:
+            self.mode = "lockstep"
+            await ws.send_str("start")
+            if msg is not None and msg.type == WSMsgType.BINARY:
+                await self.on_frame(ws, msg.data)
+        else:
+            self.mode = "window"
+        async for msg in ws:
+            if msg.type == WSMsgType.BINARY:
+                await self.on_frame(ws, msg.data)
+
+    async def on_frame(self, ws, data):
+        if self.flow_control is not None:
+            self.flow_control.on_frame()
+            # Return credits before decoding, so the next frames are already on their way
+            credits = self.flow_control.get_credits_to_return()
+            if credits > 0:
+                self.flow_control.grant(credits)
+                await ws.send_str(f"credit {credits}")
+
+        start = time.monotonic()
+        self.frame_callback(data)
+        if self.flow_control is not None:
+            if self.decode_time is not None:
+                self.flow_control.on_decoded(self.decode_time())
+            else:
+                self.flow_control.on_decoded(time.monotonic() - start)
+        else:
+            # Ready for next frame
+            await ws.send_str("ready")
+        self.update_fps()
+
+    def update_fps(self):
+        self.frame_counter += 1
+        now = time.time()
+        if now > self.last_frame_ts + self.FPS_UPDATE_INTERVAL:
+            self.fps = round(self.frame_counter / (now - self.last_frame_ts))
+            self.last_frame_ts = now
+            self.frame_counter = 0